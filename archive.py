@@ -0,0 +1,135 @@
+"""
+Bulk export / import of the fact history (sent_facts) for backups, migrations
+and offline analysis.
+
+Usage:
+    python archive.py export facts.jsonl.zst          # or .gz
+    python archive.py import facts.jsonl.zst [--rebuild-indexes]
+
+An archive is compressed JSON lines: a header line, then one object per fact
+(id, title, content, content_hash, topic_category, topic_hint, simhash, tenant
+name, sent_at). Rows stream through Postgres COPY straight into the compressor
+and back, so memory stays flat however large the table is. Files ending in
+.zst use zstd (needs `pip install zstandard`); anything else is gzip. Import
+detects the format from the file itself.
+
+Import is one transaction: facts already in the target are skipped,
+content_hash is recomputed from the content, and tenants are matched by name
+(missing ones are created inactive). --rebuild-indexes drops the plain
+sent_facts indexes for the load and rebuilds them in the same transaction,
+which is faster for archives much larger than the table; sent_facts is locked
+until the import commits. Fingerprints missing from an archive
+are backfilled by near_dup.load(); restart a running server afterwards so its
+dedup caches see the imported facts.
+"""
+import io
+import json
+import gzip
+import time
+import logging
+import argparse
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+import database
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise SystemExit("zstd archives need the 'zstandard' package (pip install zstandard) — or use a .gz file")
+
+
+def _open_writer(path: str, level: int | None):
+    if path.endswith(".zst"):
+        compressor = _zstd().ZstdCompressor(level=3 if level is None else level)
+        return "zstd", compressor.stream_writer(open(path, "wb"))
+    return "gzip", gzip.open(path, "wb", compresslevel=6 if level is None else level)
+
+
+def _open_reader(path: str):
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(_ZSTD_MAGIC):
+        return io.BufferedReader(_zstd().ZstdDecompressor().stream_reader(open(path, "rb")), buffer_size=1 << 20)
+    if magic.startswith(_GZIP_MAGIC):
+        return gzip.open(path, "rb")
+    raise SystemExit(f"{path} is neither a zstd nor a gzip archive")
+
+
+def export(path: str, level: int | None = None) -> int:
+    started = time.monotonic()
+    compression, out = _open_writer(path, level)
+    with out:
+        header = {
+            "archive": "sent_facts",
+            "version": FORMAT_VERSION,
+            "schema": database.SCHEMA_VERSION,
+            "compression": compression,
+            "exportedAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        out.write(json.dumps(header).encode() + b"\n")
+        rows = database.export_facts(out)
+    elapsed = time.monotonic() - started
+    logger.info("[Archive] Exported %d fact(s) to %s (%s) in %.1fs (%.0f rows/s)",
+                rows, path, compression, elapsed, rows / elapsed if elapsed else 0)
+    return rows
+
+
+def import_(path: str, rebuild_indexes: bool = False) -> dict:
+    started = time.monotonic()
+    with _open_reader(path) as source:
+        header = json.loads(source.readline() or b"{}")
+        if header.get("archive") != "sent_facts" or header.get("version", 0) > FORMAT_VERSION:
+            raise SystemExit(f"{path} is not a sent_facts archive this version can read (header: {header})")
+
+        result = database.import_facts(source, rebuild_indexes)
+
+    elapsed = time.monotonic() - started
+    logger.info("[Archive] Imported %s from %s in %.1fs (%.0f rows/s)",
+                result, path, elapsed, result["staged"] / elapsed if elapsed else 0)
+    if result["rehashed"]:
+        logger.warning("[Archive] %d archived content_hash value(s) did not match their content and were recomputed",
+                       result["rehashed"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import the sent_facts history.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_cmd = commands.add_parser("export", help="write every sent fact to a compressed archive")
+    export_cmd.add_argument("path", help="archive to create (.zst for zstd, anything else for gzip)")
+    export_cmd.add_argument("--level", type=int, help="compression level (default: zstd 3, gzip 6)")
+    import_cmd = commands.add_parser("import", help="load an archive into sent_facts")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--rebuild-indexes", action="store_true",
+                            help="drop the plain sent_facts indexes during the load and rebuild them after")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s  %(levelname)-8s  %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    load_dotenv()
+    database.init_db()
+    try:
+        if args.command == "export":
+            export(args.path, args.level)
+        else:
+            import_(args.path, args.rebuild_indexes)
+    finally:
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Avoid-list builder for the LLM prompt.
+
+Instead of pasting the N most recent titles, each request gets the past
+titles most likely to collide with its topic hint, packed into a token
+budget:
+
+  1. the AVOID_LIST_RECENT most recent titles, whatever their topic
+  2. titles whose stored topic_category is one the hint classifies into
+     (topic_classifier), ranked together with titles sharing rare words with
+     the hint (an inverted index, IDF-weighted), newest first on ties
+  3. until AVOID_LIST_TOKEN_BUDGET (estimated tokens) is spent
+
+The index holds the newest AVOID_LIST_INDEX_SIZE titles per audience and is
+kept current as facts are saved. Step 2 is cached per (audience, topic) until
+the next fact is added, so dedup retries on the same topic reuse it.
+
+Config (env): AVOID_LIST_TOKEN_BUDGET, AVOID_LIST_RECENT, AVOID_LIST_INDEX_SIZE.
+"""
+import os
+import re
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import database
+import topic_classifier
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+_DECORATION = re.compile(r"^[^\w]+|\s+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in into is it its of on or the this to vs what when why with "
+    "you your java spring boot".split()
+)
+_MAX_TITLE_CHARS = 90
+_SCAN_LIMIT = 2000   # newest postings considered per term / category
+_MAX_RELEVANT = 200  # far more than any sensible budget fits
+_CACHE_SIZE = 256
+
+
+def _terms(text: str) -> set[str]:
+    return {t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS and len(t) > 1}
+
+
+def compress(title: str) -> str:
+    """Strip leading emoji/markdown, collapse whitespace and cap the length."""
+    title = _DECORATION.sub(" ", title).strip()
+    return title if len(title) <= _MAX_TITLE_CHARS else title[:_MAX_TITLE_CHARS - 1].rstrip() + "…"
+
+
+def estimate_tokens(line: str) -> int:
+    # ~4 characters per token, plus the "- " bullet and newline
+    return len(line) // 4 + 2
+
+
+class TitleIndex:
+    """Titles of one audience, oldest first, with term and category postings."""
+
+    def __init__(self):
+        self.titles: list[str] = []
+        self._postings: dict[str, list[int]] = {}
+        self._by_category: dict[str, list[int]] = {}
+
+    def add(self, title: str, category: str | None):
+        i = len(self.titles)
+        self.titles.append(title)
+        for term in _terms(title):
+            self._postings.setdefault(term, []).append(i)
+        if category:
+            self._by_category.setdefault(category, []).append(i)
+
+    def relevant(self, terms: set[str], categories: set[str]) -> list[int]:
+        """Title positions ranked by IDF-weighted term overlap plus a category bonus, newest first on ties."""
+        total = len(self.titles) or 1
+        scores: dict[int, float] = {}
+        for term in terms:
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + total / len(posting))
+            for i in posting[-_SCAN_LIMIT:]:
+                scores[i] = scores.get(i, 0.0) + idf
+        bonus = math.log(1 + total)   # one category match outweighs any single shared word
+        for category in categories:
+            for i in self._by_category.get(category, ())[-_SCAN_LIMIT:]:
+                scores[i] = scores.get(i, 0.0) + bonus
+        return sorted(scores, key=lambda i: (-scores[i], -i))
+
+
+_lock = threading.Lock()
+_indexes: dict[int, TitleIndex] | None = None   # one per tenant (0 = default audience)
+_version = 0
+_cache: OrderedDict[tuple, tuple[int, list[str]]] = OrderedDict()
+
+
+def load():
+    global _indexes, _version
+    started = time.monotonic()
+    per_tenant = int(os.getenv("AVOID_LIST_INDEX_SIZE", "50000"))
+    indexes: dict[int, TitleIndex] = {}
+    for tenant_key, title, category in database.iter_title_index(per_tenant):
+        indexes.setdefault(tenant_key, TitleIndex()).add(title, category)
+    with _lock:
+        _indexes = indexes
+        _version += 1
+        _cache.clear()
+    logger.info("[AvoidList] Indexed %d titles across %d audience(s) in %.2fs",
+                sum(len(i.titles) for i in indexes.values()), len(indexes), time.monotonic() - started)
+
+
+def add(title: str, category: str | None, tenant_id: int | None = None):
+    global _version
+    with _lock:
+        if _indexes is None:
+            return
+        _indexes.setdefault(tenant_id or 0, TitleIndex()).add(title, category)
+        _version += 1
+
+
+def _relevant_titles(topic: str, audiences: tuple[int, ...]) -> list[str]:
+    key = (audiences, topic)
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == _version:
+            _cache.move_to_end(key)
+            return cached[1]
+        version = _version
+        terms = _terms(topic)
+        categories = {category for category, _ in topic_classifier.classify(topic)}
+        titles = []
+        for audience in audiences:
+            index = _indexes.get(audience)
+            if index is not None:
+                titles.extend(index.titles[i] for i in index.relevant(terms, categories)[:_MAX_RELEVANT])
+        _cache[key] = (version, titles)
+        if len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return titles
+
+
+def build(topic: str, recent_titles: list[str] | None = None, tenant_ids: list[int] | None = None) -> list[str]:
+    """
+    The avoid-list for one request on `topic`: the most recent titles first,
+    then the most relevant ones, compressed and cut off at the token budget.
+    Falls back to just the recent titles until load() has run.
+    """
+    budget = int(os.getenv("AVOID_LIST_TOKEN_BUDGET", "300"))
+    recent_count = int(os.getenv("AVOID_LIST_RECENT", "5"))
+    recent = list(recent_titles or [])
+
+    candidates = recent[:recent_count]
+    if _indexes is not None:
+        audiences = tuple(sorted({t or 0 for t in tenant_ids})) if tenant_ids else (0,)
+        candidates += _relevant_titles(topic, audiences)
+    candidates += recent[recent_count:]
+
+    picked, seen, spent = [], set(), 0
+    for title in candidates:
+        line = compress(title)
+        if not line or line.lower() in seen:
+            continue
+        cost = estimate_tokens(line)
+        if spent + cost > budget:
+            break
+        picked.append(line)
+        seen.add(line.lower())
+        spent += cost
+    return picked
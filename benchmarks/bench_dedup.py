@@ -0,0 +1,122 @@
+"""
+Dedup query benchmark against a large sent_facts table.
+
+Seeds a *scratch* database with synthetic rows (1M by default) and compares
+the legacy two-query check (title_exists + hash_exists, no title index)
+with the single indexed database.find_new() lookup, single and batched.
+
+Usage:
+    BENCH_DB_NAME=factdb_bench python benchmarks/bench_dedup.py [rows] [lookups]
+
+BENCH_DB_NAME is required so this never touches the real fact history.
+"""
+import os
+import sys
+import time
+import hashlib
+import random
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+bench_db = os.getenv("BENCH_DB_NAME")
+if not bench_db:
+    sys.exit("Set BENCH_DB_NAME to a scratch database (it will be filled with synthetic rows).")
+os.environ["DB_NAME"] = bench_db
+
+import database
+
+SEED_SQL = """
+    INSERT INTO sent_facts (title, content, content_hash, topic_category, sent_at)
+    SELECT 'Bench fact #' || g,
+           'Synthetic body ' || g,
+           encode(sha256(('bench-' || g)::bytea), 'hex'),
+           'Bench',
+           NOW() - g * INTERVAL '1 minute'
+    FROM generate_series(%s, %s) AS g
+"""
+
+
+def seed(rows: int):
+    database.init_db()
+    with database.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM sent_facts")
+            have = cur.fetchone()[0]
+            if have < rows:
+                print(f"Seeding {rows - have:,} rows...")
+                cur.execute(SEED_SQL, (have + 1, rows))
+            cur.execute("ANALYZE sent_facts")
+
+
+def set_title_index(enabled: bool):
+    with database.connection() as conn:
+        with conn.cursor() as cur:
+            if enabled:
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_sent_facts_title ON sent_facts (title)")
+            else:
+                cur.execute("DROP INDEX IF EXISTS idx_sent_facts_title")
+            cur.execute("ANALYZE sent_facts")
+
+
+def sample_candidates(rows: int, n: int) -> list[tuple[str, str]]:
+    """Half existing rows, half brand-new candidates."""
+    out = []
+    for i in range(n):
+        if i % 2:
+            g = random.randint(1, rows)
+            out.append((f"Bench fact #{g}", _bench_hash(g)))
+        else:
+            out.append((f"New candidate {i}-{random.random()}", f"{random.getrandbits(256):064x}"))
+    return out
+
+
+def _bench_hash(g: int) -> str:
+    return hashlib.sha256(f"bench-{g}".encode()).hexdigest()
+
+
+def timed(fn, items) -> list[float]:
+    samples = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def report(label: str, samples: list[float], per: int = 1):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<42} n={len(samples):<5} p50={statistics.median(samples):8.3f} ms  "
+          f"p99={p99:8.3f} ms  per-candidate={statistics.mean(samples) / per:8.3f} ms")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    seed(rows)
+    candidates = sample_candidates(rows, lookups)
+
+    set_title_index(False)
+    legacy = timed(lambda c: database.title_exists(c[0]) or database.hash_exists(c[1]),
+                   candidates[: max(lookups // 10, 10)])
+    report("legacy title_exists+hash_exists (no index)", legacy)
+
+    set_title_index(True)
+    report("legacy title_exists+hash_exists (indexed)",
+           timed(lambda c: database.title_exists(c[0]) or database.hash_exists(c[1]), candidates))
+    report("is_duplicate (one query)", timed(lambda c: database.is_duplicate(*c), candidates))
+
+    batch = 25
+    batches = [candidates[i:i + batch] for i in range(0, len(candidates), batch)]
+    report(f"find_new (batch of {batch})", timed(database.find_new, batches), per=batch)
+
+    print("pool:", database.pool_stats())
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
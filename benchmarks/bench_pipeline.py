@@ -0,0 +1,425 @@
+"""
+End-to-end benchmark / load-test suite.
+
+Runs the real code paths against local stand-ins only:
+  - a *scratch* Postgres database (BENCH_DB_NAME), grown step by step to each --sizes value
+  - an in-process SMTP sink (benchmarks/smtp_sink.py) instead of Gmail
+  - the fake LLM backend (LLM_BACKEND=fake, LLM_FAKE_LATENCY seconds per call)
+
+Scenarios (pick with --only):
+  render    email_sender._markdown_to_html
+  dedup     dedup_cache.load, dedup_cache.check, near_dup.find_similar,
+            database.is_duplicate and batched find_new — per table size
+  pipeline  pipeline.run() end to end — per table size
+  archive   archive.export / archive.import_ round trip (with and without
+            --rebuild-indexes); the history must come back unchanged — per table size
+  email     email_sender.send to 1 → 10k recipients
+  http      main.Handler: concurrent GET /health and POST /trigger
+
+Each result (n, throughput, p50/p99, peak memory) is printed, compared with
+the previous run of the same scenario and appended to --results (JSON lines),
+so a regression shows up as a delta on the next run.
+
+Usage:
+    BENCH_DB_NAME=factdb_bench python benchmarks/bench_pipeline.py [--quick] [--only dedup,email] ...
+
+BENCH_DB_NAME is required and its fact tables are emptied first (unless --keep).
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import random
+import asyncio
+import argparse
+import datetime
+import statistics
+import tempfile
+import subprocess
+import tracemalloc
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+bench_db = os.getenv("BENCH_DB_NAME")
+if not bench_db:
+    sys.exit("Set BENCH_DB_NAME to a scratch database (its fact tables are emptied and filled with synthetic rows).")
+
+# Local stand-ins win over anything in .env; load_dotenv never overrides what is already set
+os.environ["DB_NAME"] = bench_db
+os.environ["LLM_BACKEND"] = "fake"
+os.environ.setdefault("LLM_FAKE_LATENCY", "0.2")
+os.environ["SMTP_HOST"] = "127.0.0.1"
+os.environ["SMTP_STARTTLS"] = "false"
+os.environ["SMTP_RATE_PER_CONN"] = os.getenv("BENCH_SMTP_RATE", "0")
+os.environ["MAIL_SENDER"] = "bench@localhost"
+os.environ["MAIL_APP_PASSWORD"] = ""
+os.environ["MAIL_RECIPIENT"] = "reader@bench.local"
+os.environ["FACT_BUFFER_SIZE"] = "0"
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import archive
+import avoid_list
+import database
+import dedup_cache
+import email_sender
+import main as server
+import near_dup
+import pipeline
+import topic_scheduler
+from bench_render import SAMPLE
+from fact_generator import GeneratedFact
+from smtp_sink import SMTPSink
+
+SEED_SQL = """
+    INSERT INTO sent_facts (title, content, content_hash, topic_category, simhash, sent_at)
+    SELECT 'Bench fact #' || g,
+           'Synthetic body ' || g,
+           encode(sha256(convert_to('Synthetic body ' || g, 'UTF8')), 'hex'),
+           'Bench',
+           ('x' || substr(md5(g::text), 1, 16))::bit(64)::bigint,
+           NOW() - g * INTERVAL '1 minute'
+    FROM generate_series(%s, %s) AS g
+"""
+
+
+# ── Measurement ────────────────────────────────────────────────────────────
+class Recorder:
+    def __init__(self, path: str, trace_memory: bool):
+        self.path = path
+        self.trace_memory = trace_memory
+        self.previous = self._load_previous()
+        self.run_id = datetime.datetime.now().isoformat(timespec="seconds")
+        self.commit = _git_commit()
+        if trace_memory:
+            tracemalloc.start()
+
+    def _load_previous(self) -> dict:
+        latest = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        latest[(rec["scenario"], json.dumps(rec["params"], sort_keys=True))] = rec
+        return latest
+
+    def start(self):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        return time.perf_counter()
+
+    def record(self, scenario: str, params: dict, samples_ms: list[float], started: float, units: int | None = None):
+        """units = work items done in the interval (defaults to one per sample) for the throughput figure."""
+        elapsed = time.perf_counter() - started
+        samples = sorted(samples_ms)
+        rec = {
+            "run": self.run_id,
+            "commit": self.commit,
+            "scenario": scenario,
+            "params": params,
+            "n": len(samples),
+            "throughput_per_s": round((units if units is not None else len(samples)) / elapsed, 2) if elapsed else None,
+            "p50_ms": round(statistics.median(samples), 3) if samples else None,
+            "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3) if samples else None,
+            "peak_traced_mb": round(tracemalloc.get_traced_memory()[1] / 2**20, 2) if self.trace_memory else None,
+            "max_rss_mb": _max_rss_mb(),
+        }
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec) + "\n")
+        self._print(rec)
+
+    def _print(self, rec: dict):
+        label = rec["scenario"] + "".join(f" {k}={v}" for k, v in rec["params"].items())
+        line = (f"{label:<44} n={rec['n']:<6} {rec['throughput_per_s'] or 0:>10.1f}/s  "
+                f"p50={rec['p50_ms'] or 0:9.3f} ms  p99={rec['p99_ms'] or 0:9.3f} ms")
+        if rec["peak_traced_mb"] is not None:
+            line += f"  peak={rec['peak_traced_mb']:.1f} MB"
+        prev = self.previous.get((rec["scenario"], json.dumps(rec["params"], sort_keys=True)))
+        if prev and prev.get("p50_ms") and rec["p50_ms"] is not None:
+            line += f"  (p50 {(rec['p50_ms'] / prev['p50_ms'] - 1) * 100:+.0f}% vs {prev['commit'] or prev['run']})"
+        print(line, flush=True)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCH_DIR, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _max_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def timed(fn, items) -> list[float]:
+    samples = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+# ── Database setup ─────────────────────────────────────────────────────────
+def reset():
+    with database.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("TRUNCATE sent_facts, pending_facts, pipeline_jobs, topic_stats")
+
+
+def grow_to(rows: int):
+    with database.connection() as conn:
+        with conn.cursor() as cur:
+            # Count only seeded rows so facts added by pipeline runs don't shift the numbering
+            cur.execute("SELECT COUNT(*) FROM sent_facts WHERE topic_category = 'Bench'")
+            have = cur.fetchone()[0]
+            if have < rows:
+                print(f"-- seeding sent_facts {have:,} → {rows:,} rows", flush=True)
+                cur.execute(SEED_SQL, (have + 1, rows))
+            elif have > rows * 1.1:
+                print(f"   ! sent_facts already holds {have:,} rows (target {rows:,}); run without --keep")
+            cur.execute("ANALYZE sent_facts")
+
+
+def history_digest() -> tuple[int, str]:
+    """Row count and a digest of sent_facts as an archive carries it (content_hash aside: import recomputes it)."""
+    with database.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT COUNT(*), md5(string_agg(concat_ws('|', s.id, s.title, s.content, s.topic_category,
+                                                          s.topic_hint, s.simhash, t.name, s.sent_at),
+                                                E'\\n' ORDER BY s.id))
+                FROM sent_facts s LEFT JOIN tenants t ON t.id = s.tenant_id
+            """)
+            return cur.fetchone()
+
+
+def candidates(rows: int, n: int) -> list[tuple[str, str]]:
+    """Half rows that exist, half brand-new ones."""
+    out = []
+    for i in range(n):
+        if i % 2:
+            g = random.randint(1, rows)
+            out.append((f"Bench fact #{g}", hashlib.sha256(f"Synthetic body {g}".encode()).hexdigest()))
+        else:
+            out.append((f"New candidate {i}-{random.random()}", f"{random.getrandbits(256):064x}"))
+    return out
+
+
+# ── Scenarios ──────────────────────────────────────────────────────────────
+def bench_render(rec: Recorder, args):
+    started = rec.start()
+    samples = timed(lambda _: email_sender._markdown_to_html(SAMPLE), range(args.renders))
+    rec.record("render.markdown_to_html", {}, samples, started)
+
+
+def bench_dedup(rec: Recorder, args, rows: int):
+    params = {"rows": rows}
+    started = rec.start()
+    dedup_cache.load()
+    rec.record("dedup.cache_load", params, [(time.perf_counter() - started) * 1000], started)
+    started = rec.start()
+    near_dup.load()
+    rec.record("dedup.near_dup_load", params, [(time.perf_counter() - started) * 1000], started)
+
+    cands = candidates(rows, args.lookups)
+    started = rec.start()
+    rec.record("dedup.cache_check", params, timed(lambda c: dedup_cache.check(*c), cands * 10), started)
+    fps = [random.getrandbits(64) for _ in range(len(cands) * 10)]
+    started = rec.start()
+    rec.record("dedup.near_dup_find", params, timed(near_dup.find_similar, fps), started)
+    started = rec.start()
+    rec.record("dedup.db_is_duplicate", params, timed(lambda c: database.is_duplicate(*c), cands), started)
+    batches = [cands[i:i + 25] for i in range(0, len(cands), 25)]
+    started = rec.start()
+    rec.record("dedup.db_find_new_x25", params, timed(database.find_new, batches), started, units=len(cands))
+
+
+def bench_pipeline(rec: Recorder, args, rows: int, sink: SMTPSink):
+    before = sink.messages
+    started = rec.start()
+    samples = timed(lambda _: pipeline.run(), range(args.runs))
+    rec.record("pipeline.run", {"rows": rows, "llm_latency_s": float(os.environ["LLM_FAKE_LATENCY"])},
+               samples, started)
+    if sink.messages - before != args.runs:
+        print(f"   ! expected {args.runs} emails, sink received {sink.messages - before}")
+
+
+def bench_archive(rec: Recorder, args, rows: int):
+    expected = history_digest()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "facts.jsonl.gz")
+        started = rec.start()
+        archive.export(path)
+        rec.record("archive.export", {"rows": rows}, [(time.perf_counter() - started) * 1000], started,
+                   units=expected[0])
+        for rebuild in (False, True):
+            with database.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("TRUNCATE sent_facts")
+            started = rec.start()
+            result = archive.import_(path, rebuild)
+            rec.record("archive.import", {"rows": rows, "rebuild_indexes": rebuild},
+                       [(time.perf_counter() - started) * 1000], started, units=result["staged"])
+            if history_digest() != expected:
+                print(f"   ! archive round trip changed sent_facts (rebuild_indexes={rebuild}): {result}")
+        again = archive.import_(path)
+        if again["inserted"]:
+            print(f"   ! re-importing the same archive inserted {again['inserted']} fact(s)")
+
+
+def bench_email(rec: Recorder, args, sink: SMTPSink):
+    fact = GeneratedFact("Virtual Threads", SAMPLE, "bench-email", "Concurrency")
+    for n in args.recipients:
+        recipients = [f"user{i}@bench.local" for i in range(n)]
+        reps = max(1, min(5, 1000 // n))
+        started = rec.start()
+        samples = timed(lambda _: email_sender.send(fact, recipients), range(reps))
+        rec.record("email.send", {"recipients": n, "pool": int(os.getenv("SMTP_POOL_SIZE", "2"))},
+                   samples, started, units=n * reps)
+
+
+async def _http(port: int, method: str, path: str) -> tuple[int, bytes]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: 0\r\n\r\n".encode())
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    return int(head.split()[1]), body
+
+
+async def _load(port: int, method: str, path: str, total: int, concurrency: int):
+    samples, codes = [], {}
+    remaining = iter(range(total))
+
+    async def client():
+        for _ in remaining:
+            t0 = time.perf_counter()
+            code, _ = await _http(port, method, path)
+            samples.append((time.perf_counter() - t0) * 1000)
+            codes[code] = codes.get(code, 0) + 1
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return samples, codes
+
+
+def bench_http(rec: Recorder, args):
+    async def scenario():
+        queue = server.TriggerQueue(maxsize=int(os.getenv("TRIGGER_QUEUE_SIZE", "4")),
+                                    workers=int(os.getenv("PIPELINE_WORKERS", "1")))
+        queue.start()
+        health = server.HealthCache(ttl=float(os.getenv("HEALTH_CACHE_TTL", "60")))
+        health.refresh()
+        srv = await asyncio.start_server(lambda r, w: server.Handler(r, w, queue, health).handle(), "127.0.0.1", 0)
+        port = srv.sockets[0].getsockname()[1]
+        params = {"concurrency": args.concurrency}
+        try:
+            started = rec.start()
+            samples, codes = await _load(port, "GET", "/health", args.requests, args.concurrency)
+            rec.record("http.get_health", params, samples, started)
+
+            started = rec.start()
+            samples, codes = await _load(port, "POST", "/trigger", args.requests, args.concurrency)
+            rec.record("http.post_trigger", params, samples, started)
+            print(f"   /trigger status codes: {codes}; queue: {queue.stats()}")
+
+            drain = time.perf_counter()
+            while queue.stats()["queued"] or queue.stats()["running"]:
+                await asyncio.sleep(0.05)
+            print(f"   queued runs drained in {time.perf_counter() - drain:.2f}s")
+        finally:
+            srv.close()
+            await health.stop()
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+# ── Entry point ────────────────────────────────────────────────────────────
+def _ints(value: str) -> list[int]:
+    return [int(float(v)) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=_ints, default=_ints("1000,10000,100000,1000000"))
+    parser.add_argument("--recipients", type=_ints, default=_ints("1,10,100,1000,10000"))
+    parser.add_argument("--runs", type=int, default=20, help="pipeline.run() calls per table size")
+    parser.add_argument("--lookups", type=int, default=200, help="DB dedup lookups per table size")
+    parser.add_argument("--renders", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=500, help="HTTP requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--only", default="render,dedup,pipeline,archive,email,http")
+    parser.add_argument("--quick", action="store_true", help="sizes 1k,10k; recipients 1,10,100; fewer runs")
+    parser.add_argument("--keep", action="store_true", help="don't empty the scratch tables first")
+    parser.add_argument("--tracemalloc", action="store_true", help="report peak Python heap per scenario (slower)")
+    parser.add_argument("--results", default=os.path.join(BENCH_DIR, "results.jsonl"))
+    parser.add_argument("--verbose", action="store_true", help="keep the app's INFO logging")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    if args.quick:
+        args.sizes, args.recipients, args.runs, args.requests = [1000, 10000], [1, 10, 100], 5, 100
+    only = set(args.only.split(","))
+
+    sink = SMTPSink().start()
+    os.environ["SMTP_PORT"] = str(sink.port)
+    rec = Recorder(args.results, args.tracemalloc)
+    print(f"Scratch DB '{bench_db}', SMTP sink :{sink.port}, fake LLM latency {os.environ['LLM_FAKE_LATENCY']}s")
+
+    try:
+        database.init_db()
+        if not args.keep:
+            reset()
+        if "render" in only:
+            bench_render(rec, args)
+        for size in sorted(args.sizes):
+            if not only & {"dedup", "pipeline", "archive"}:
+                break
+            grow_to(size)
+            if "dedup" in only:
+                bench_dedup(rec, args, size)
+            if "pipeline" in only:
+                if "dedup" not in only:
+                    dedup_cache.load()
+                    near_dup.load()
+                avoid_list.load()
+                topic_scheduler.load()
+                bench_pipeline(rec, args, size, sink)
+            if "archive" in only:
+                bench_archive(rec, args, size)
+        if "email" in only:
+            bench_email(rec, args, sink)
+        if "http" in only:
+            if not dedup_cache.stats()["loaded"]:
+                dedup_cache.load()
+                near_dup.load()
+                avoid_list.load()
+                topic_scheduler.load()
+            bench_http(rec, args)
+    finally:
+        email_sender.close()
+        database.close_pool()
+        sink.stop()
+    print(f"Results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Email rendering micro-benchmark: 10k renders of a typical fact.
+
+Compares the uncached Markdown→HTML pass, a cold full-email render and the
+content_hash-cached path that retries and multi-recipient sends hit.
+
+Usage:
+    python benchmarks/bench_render.py [renders]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import email_sender
+from fact_generator import GeneratedFact
+
+SAMPLE = """## Virtual Threads and Pinning
+
+**💡 In a Nutshell**
+Virtual threads are cheap, JVM-scheduled threads — think of them as *tickets* rather than dedicated
+cashiers. They park on blocking I/O instead of holding an OS thread, so `newVirtualThreadPerTaskExecutor()`
+can run millions of tasks.
+
+**🔧 Quick Example**
+```java
+try (var executor = Executors.newVirtualThreadPerTaskExecutor()) {
+    IntStream.range(0, 10_000).forEach(i ->
+        executor.submit(() -> {
+            Thread.sleep(Duration.ofSeconds(1));
+            return i;
+        }));
+}
+```
+
+**⚡ Key Takeaway**
+- Use them for **I/O-bound** request handling, not CPU-bound number crunching
+- `synchronized` blocks around blocking calls *pin* the carrier thread — prefer `ReentrantLock`
+- Don't pool virtual threads; create one per task
+
+**🔗 Learn More** — [JEP 444: Virtual Threads](https://openjdk.org/jeps/444)
+"""
+
+
+def bench(label: str, fn, n: int):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<34} {n:>6} renders  {elapsed * 1000:9.1f} ms total  {elapsed / n * 1e6:8.2f} µs/render")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    facts = [GeneratedFact("Virtual Threads", SAMPLE, f"hash-{i}", "Concurrency") for i in range(n)]
+    cached = GeneratedFact("Virtual Threads", SAMPLE, "hash-cached", "Concurrency")
+
+    bench("_markdown_to_html (no cache)", lambda i: email_sender._markdown_to_html(SAMPLE), n)
+    bench("_build_html (cold, unique hash)", lambda i: email_sender._build_html(facts[i]), n)
+    bench("_build_html (cached hash)", lambda i: email_sender._build_html(cached), n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Minimal local SMTP sink for benchmarks: accepts every message and throws it away.
+
+Speaks just enough ESMTP for smtplib (EHLO/HELO, AUTH, MAIL, RCPT, DATA,
+RSET, NOOP, QUIT) with no TLS, so point email_sender at it with
+SMTP_STARTTLS=false. Each connection gets its own thread.
+
+Usage:
+    python benchmarks/smtp_sink.py [port]      # standalone, Ctrl+C to stop
+"""
+import sys
+import threading
+import socketserver
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        self._reply("220 bench-sink ESMTP ready")
+        recipients = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line[:4].upper()
+            if verb == b"EHLO":
+                self.wfile.write(b"250-bench-sink\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == b"HELO":
+                self._reply("250 bench-sink")
+            elif verb == b"AUTH":
+                self._reply("235 2.7.0 Authentication successful")
+            elif verb == b"MAIL":
+                recipients = 0
+                self._reply("250 OK")
+            elif verb == b"RCPT":
+                recipients += 1
+                self._reply("250 OK")
+            elif verb == b"DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk == b".\r\n":
+                        break
+                    size += len(chunk)
+                sink.record(recipients, size)
+                self._reply("250 OK queued")
+            elif verb in (b"RSET", b"NOOP"):
+                self._reply("250 OK")
+            elif verb == b"QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.sink = self
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.recipients = 0
+        self.bytes = 0
+        self._thread: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def record(self, recipients: int, size: int):
+        with self._lock:
+            self.messages += 1
+            self.recipients += recipients
+            self.bytes += size
+
+    def start(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    sink = SMTPSink(port=int(sys.argv[1]) if len(sys.argv) > 1 else 1025).start()
+    print(f"SMTP sink listening on 127.0.0.1:{sink.port} (SMTP_STARTTLS=false)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        sink.stop()
+        print(f"{sink.messages} message(s), {sink.recipients} recipient(s), {sink.bytes} bytes")
@@ -1,7 +1,11 @@
 import psycopg2
 import psycopg2.extras
 import os
+import time
+import hashlib
 import logging
+import threading
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +27,214 @@ def get_connection():
     return psycopg2.connect(**conn_params)
 
 
-def init_db():
-    """Create the sent_facts table if it doesn't exist."""
-    sql = """
+# ── Connection pool ────────────────────────────────────────────────────────
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """
+    Process-wide, thread-safe pool of psycopg2 connections.
+    Idle connections are pinged before reuse once they have sat unused for
+    `check_after` seconds; dead ones are replaced transparently.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, check_after: float):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_after = check_after
+        self._idle: list[tuple] = []      # (conn, last_used monotonic)
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        # Stats
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._created = 0
+        self._reconnects = 0
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        conn = get_connection()
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._in_use + len(self._idle) < self.maxconn:
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"no DB connection free after {self.timeout:.1f}s (max={self.maxconn})")
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._checkouts += 1
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self._waits += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        # Connect / validate outside the lock so slow handshakes don't block other threads
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif not self._is_healthy(conn, last_used):
+                logger.warning("[DB] Pooled connection is dead — reconnecting")
+                _close_quietly(conn)
+                conn = self._connect()
+                with self._cond:
+                    self._reconnects += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, discard: bool = False):
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed:
+                _close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max": self.maxconn,
+                "inUse": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "avgWaitMs": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "maxWaitMs": round(self._wait_max * 1000, 3),
+                "created": self._created,
+                "reconnects": self._reconnects,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the shared pool, creating it on first use (after .env has been loaded)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                minconn = int(os.getenv("DB_POOL_MIN", "1"))
+                maxconn = max(int(os.getenv("DB_POOL_MAX", "5")), minconn, 1)
+                _pool = ConnectionPool(
+                    minconn=minconn,
+                    maxconn=maxconn,
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                    check_after=float(os.getenv("DB_POOL_CHECK_AFTER", "30")),
+                )
+                logger.info("[DB] Connection pool ready (min=%d, max=%d)", minconn, maxconn)
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+            logger.info("[DB] Connection pool closed.")
+
+
+def pool_stats() -> dict:
+    return _pool.stats() if _pool is not None else {}
+
+
+@contextmanager
+def connection():
+    """
+    Borrow a pooled connection. Commits on success, rolls back on error and
+    drops the connection instead of returning it if it turned out to be broken.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        raise
+    finally:
+        pool.putconn(conn, discard=broken)
+
+
+_SCHEMA_DDL = """
+        -- Audiences beyond the default MAIL_RECIPIENT one; each has its own topics, schedule and history
+        CREATE TABLE IF NOT EXISTS tenants (
+            id             SERIAL PRIMARY KEY,
+            name           VARCHAR(200) NOT NULL UNIQUE,
+            topics         TEXT[],
+            schedule       VARCHAR(100) NOT NULL DEFAULT '30 3 * * *',
+            subject_prefix VARCHAR(200) NOT NULL DEFAULT '☕ Java Fact of the Day',
+            active         BOOLEAN NOT NULL DEFAULT TRUE
+        );
+        CREATE TABLE IF NOT EXISTS subscribers (
+            tenant_id  INT NOT NULL REFERENCES tenants (id) ON DELETE CASCADE,
+            email      VARCHAR(320) NOT NULL,
+            PRIMARY KEY (tenant_id, email)
+        );
+
         CREATE TABLE IF NOT EXISTS sent_facts (
             id            UUID PRIMARY KEY DEFAULT gen_random_uuid(),
             title         VARCHAR(500) NOT NULL,
@@ -34,50 +243,652 @@ def init_db():
             topic_category VARCHAR(100),
             sent_at       TIMESTAMP DEFAULT NOW()
         );
+        CREATE INDEX IF NOT EXISTS idx_sent_facts_title ON sent_facts (title);
+        CREATE INDEX IF NOT EXISTS idx_sent_facts_sent_at ON sent_facts (sent_at DESC);
+        ALTER TABLE sent_facts ADD COLUMN IF NOT EXISTS simhash BIGINT;
+        -- tenant_id NULL is the default audience; content_hash is unique per tenant
+        ALTER TABLE sent_facts ADD COLUMN IF NOT EXISTS tenant_id INT REFERENCES tenants (id);
+        ALTER TABLE sent_facts DROP CONSTRAINT IF EXISTS sent_facts_content_hash_key;
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_sent_facts_tenant_hash ON sent_facts ((COALESCE(tenant_id, 0)), content_hash);
+        CREATE INDEX IF NOT EXISTS idx_sent_facts_tenant_title ON sent_facts ((COALESCE(tenant_id, 0)), title);
+        CREATE INDEX IF NOT EXISTS idx_sent_facts_tenant_sent_at ON sent_facts ((COALESCE(tenant_id, 0)), sent_at DESC);
+        -- The TOPIC_AREAS entry the fact was requested for (NULL for facts from before the topic scheduler)
+        ALTER TABLE sent_facts ADD COLUMN IF NOT EXISTS topic_hint VARCHAR(300);
+
+        -- Pre-generated, already-deduplicated facts waiting to be sent
+        CREATE TABLE IF NOT EXISTS pending_facts (
+            id            UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            title         VARCHAR(500) NOT NULL,
+            content       TEXT NOT NULL,
+            content_hash  VARCHAR(64) NOT NULL UNIQUE,
+            topic_category VARCHAR(100),
+            simhash       BIGINT,
+            created_at    TIMESTAMP DEFAULT NOW()
+        );
+        CREATE INDEX IF NOT EXISTS idx_pending_facts_title ON pending_facts (title);
+        CREATE INDEX IF NOT EXISTS idx_pending_facts_created_at ON pending_facts (created_at);
+        ALTER TABLE pending_facts ADD COLUMN IF NOT EXISTS topic_hint VARCHAR(300);
+
+        -- One row per fact on its way to an audience: generated → persisted → delivered (or failed, or
+        -- duplicate when sent_facts turned out to hold the fact already).
+        -- idempotency_key is "<tenant>:<content_hash>", so a fact can only ever be in flight once.
+        CREATE TABLE IF NOT EXISTS pipeline_jobs (
+            id              BIGSERIAL PRIMARY KEY,
+            idempotency_key VARCHAR(80) NOT NULL UNIQUE,
+            tenant_id       INT REFERENCES tenants (id) ON DELETE CASCADE,
+            stage           VARCHAR(20) NOT NULL DEFAULT 'generated',
+            title           VARCHAR(500) NOT NULL,
+            content         TEXT NOT NULL,
+            content_hash    VARCHAR(64) NOT NULL,
+            topic_category  VARCHAR(100),
+            simhash         BIGINT,
+            delivered_to    TEXT[] NOT NULL DEFAULT '{}',
+            attempts        INT NOT NULL DEFAULT 1,
+            last_error      TEXT,
+            leased_until    TIMESTAMP,
+            created_at      TIMESTAMP DEFAULT NOW(),
+            updated_at      TIMESTAMP DEFAULT NOW()
+        );
+        CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_open ON pipeline_jobs ((COALESCE(tenant_id, 0)), id)
+            WHERE stage IN ('generated', 'persisted');
+        ALTER TABLE pipeline_jobs ADD COLUMN IF NOT EXISTS topic_hint VARCHAR(300);
+
+        -- Learned share of candidates per audience and topic hint that dedup rejected (an EWMA)
+        CREATE TABLE IF NOT EXISTS topic_stats (
+            tenant_key  INT NOT NULL,
+            topic       VARCHAR(300) NOT NULL,
+            dup_rate    DOUBLE PRECISION NOT NULL DEFAULT 0,
+            samples     INT NOT NULL DEFAULT 0,
+            updated_at  TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (tenant_key, topic)
+        );
+
+        -- Version of this DDL last applied, so init_db() can skip it when nothing changed
+        CREATE TABLE IF NOT EXISTS schema_meta (
+            id          INT PRIMARY KEY CHECK (id = 1),
+            version     VARCHAR(64) NOT NULL,
+            applied_at  TIMESTAMP DEFAULT NOW()
+        );
+"""
+# Changes whenever the DDL above does, so there is no version number to bump by hand
+SCHEMA_VERSION = hashlib.sha256(_SCHEMA_DDL.encode()).hexdigest()[:16]
+_SCHEMA_LOCK_ID = 7_461_726   # pg_advisory_xact_lock key serialising concurrent migrations
+
+
+def init_db() -> bool:
+    """
+    Create the fact, buffer, tenant, job and topic stats tables (and their
+    indexes) if they don't exist. Skipped when schema_meta shows this version
+    of the DDL was already applied, so a cold start costs two SELECTs instead
+    of a round of DDL and its table locks. Returns True if the DDL ran.
     """
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(sql)
-        conn.commit()
-    logger.info("[DB] Table ready.")
+            cur.execute("SELECT to_regclass('schema_meta') IS NOT NULL")
+            if cur.fetchone()[0]:
+                cur.execute("SELECT version FROM schema_meta WHERE id = 1")
+                row = cur.fetchone()
+                if row is not None and row[0] == SCHEMA_VERSION:
+                    logger.info("[DB] Schema is current (%s).", SCHEMA_VERSION)
+                    return False
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (_SCHEMA_LOCK_ID,))
+            cur.execute(_SCHEMA_DDL)
+            cur.execute("""
+                INSERT INTO schema_meta (id, version) VALUES (1, %s)
+                ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version, applied_at = NOW()
+            """, (SCHEMA_VERSION,))
+    logger.info("[DB] Table ready (schema %s).", SCHEMA_VERSION)
+    return True
 
 
 def title_exists(title: str) -> bool:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT 1 FROM sent_facts WHERE title = %s LIMIT 1", (title,))
             return cur.fetchone() is not None
 
 
 def hash_exists(content_hash: str) -> bool:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT 1 FROM sent_facts WHERE content_hash = %s LIMIT 1", (content_hash,))
             return cur.fetchone() is not None
 
 
-def save_fact(title: str, content: str, content_hash: str, topic_category: str):
+def _stream(sql: str, params: tuple = (), batch_size: int = 5000):
+    """Yield rows through a server-side cursor so large results never sit in memory at once."""
+    with connection() as conn:
+        with conn.cursor(name=f"stream_{threading.get_ident()}") as cur:
+            cur.itersize = batch_size
+            cur.execute(sql, params)
+            yield from cur
+
+
+def _tenant_key(tenant_id: int | None) -> int:
+    # Matches the COALESCE(tenant_id, 0) expression the per-tenant indexes are built on
+    return tenant_id or 0
+
+
+def iter_dedup_keys(batch_size: int = 5000):
+    """Stream (tenant key, title, content_hash) for every sent or buffered fact."""
+    yield from _stream(
+        "SELECT COALESCE(tenant_id, 0), title, content_hash FROM sent_facts "
+        "UNION ALL SELECT 0, title, content_hash FROM pending_facts",
+        batch_size=batch_size,
+    )
+
+
+def iter_title_index(per_tenant: int, batch_size: int = 5000):
+    """
+    Stream (tenant key, title, topic_category), oldest first within each tenant,
+    for the newest `per_tenant` sent facts of every tenant plus all buffered ones.
+    """
     sql = """
-        INSERT INTO sent_facts (title, content, content_hash, topic_category)
-        VALUES (%s, %s, %s, %s)
+        SELECT tenant_key, title, topic_category FROM (
+            SELECT COALESCE(tenant_id, 0) AS tenant_key, title, topic_category, sent_at AS at,
+                   ROW_NUMBER() OVER (PARTITION BY COALESCE(tenant_id, 0) ORDER BY sent_at DESC) AS rn
+            FROM sent_facts
+            UNION ALL
+            SELECT 0, title, topic_category, created_at, 0 FROM pending_facts
+        ) AS t
+        WHERE rn <= %s
+        ORDER BY tenant_key, at
+    """
+    yield from _stream(sql, (per_tenant,), batch_size)
+
+
+def iter_simhashes(batch_size: int = 5000):
+    """
+    Stream (tenant key, id, simhash, content) for sent and buffered facts; content is
+    only sent for sent_facts rows still missing a simhash (buffered rows always have one).
     """
-    with get_connection() as conn:
+    yield from _stream(
+        "SELECT COALESCE(tenant_id, 0), id, simhash, CASE WHEN simhash IS NULL THEN content END FROM sent_facts "
+        "UNION ALL SELECT 0, id, simhash, NULL FROM pending_facts WHERE simhash IS NOT NULL",
+        batch_size=batch_size,
+    )
+
+
+def set_simhashes(rows: list[tuple[int, str]]):
+    """Bulk-update (simhash, id) pairs."""
+    with connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(sql, (title, content, content_hash, topic_category))
-        conn.commit()
-    logger.info("[DB] Fact saved: '%s'", title)
+            psycopg2.extras.execute_batch(cur, "UPDATE sent_facts SET simhash = %s WHERE id = %s", rows, page_size=500)
+
+
+def find_new(candidates: list[tuple[str, str]], tenant_id: int | None = None) -> list[tuple[str, str]]:
+    """
+    Given (title, content_hash) pairs, return those the tenant has neither been
+    sent nor has buffered, in input order. Title and hash are checked together
+    in one indexed query per table; repeats within the batch are dropped too.
+    """
+    if not candidates:
+        return []
+    titles = list({t for t, _ in candidates})
+    hashes = list({h for _, h in candidates})
+    sql = (
+        "SELECT title, content_hash FROM sent_facts "
+        "WHERE COALESCE(tenant_id, 0) = %(tenant)s AND (title = ANY(%(titles)s) OR content_hash = ANY(%(hashes)s))"
+    )
+    if tenant_id is None:
+        # Only the default audience draws from the pre-generated buffer
+        sql += (
+            " UNION ALL SELECT title, content_hash FROM pending_facts "
+            "WHERE title = ANY(%(titles)s) OR content_hash = ANY(%(hashes)s)"
+        )
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {"tenant": _tenant_key(tenant_id), "titles": titles, "hashes": hashes})
+            rows = cur.fetchall()
+
+    seen_titles = {r[0] for r in rows}
+    seen_hashes = {r[1] for r in rows}
+    fresh = []
+    for title, content_hash in candidates:
+        if title in seen_titles or content_hash in seen_hashes:
+            continue
+        seen_titles.add(title)
+        seen_hashes.add(content_hash)
+        fresh.append((title, content_hash))
+    return fresh
+
+
+def is_duplicate(title: str, content_hash: str, tenant_id: int | None = None) -> bool:
+    return not find_new([(title, content_hash)], tenant_id)
+
+
+def get_recent_titles(limit: int = 30) -> list[str]:
+    """
+    Return up to `limit` titles the default audience should steer away from:
+    buffered facts first, then the most recently sent.
+    """
+    sql = """
+        (SELECT title, 0 AS src, created_at AS at FROM pending_facts ORDER BY created_at DESC LIMIT %(n)s)
+        UNION ALL
+        (SELECT title, 1, sent_at FROM sent_facts WHERE COALESCE(tenant_id, 0) = 0 ORDER BY sent_at DESC LIMIT %(n)s)
+        ORDER BY src, at DESC
+        LIMIT %(n)s
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {"n": limit})
+            return [row[0] for row in cur.fetchall()]
+
+
+def get_recent_titles_for_tenants(tenant_ids: list[int], per_tenant: int = 30) -> list[str]:
+    """The `per_tenant` most recent titles of each given tenant, in one round trip."""
+    sql = """
+        SELECT recent.title
+        FROM unnest(%s::int[]) AS t (tid),
+        LATERAL (
+            SELECT title FROM sent_facts
+            WHERE COALESCE(tenant_id, 0) = t.tid
+            ORDER BY sent_at DESC LIMIT %s
+        ) AS recent
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (tenant_ids, per_tenant))
+            return list(dict.fromkeys(row[0] for row in cur.fetchall()))
+
+
+def buffer_fact(title: str, content: str, content_hash: str, topic_category: str, simhash: int | None = None,
+                topic_hint: str | None = None):
+    sql = """
+        INSERT INTO pending_facts (title, content, content_hash, topic_category, simhash, topic_hint)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (title, content, content_hash, topic_category, simhash, topic_hint))
+    logger.info("[DB] Fact buffered: '%s'", title)
+
+
+def take_buffered_fact(lease_seconds: int = 600) -> tuple | None:
+    """
+    Move the oldest buffered fact into sent_facts and open a leased job for it
+    at stage 'persisted', in one transaction. Returns the job row (see
+    _JOB_COLUMNS), or None if the buffer is empty. Entries sent meanwhile by
+    another process, or already tracked by a job, are dropped.
+    """
+    pop_sql = """
+        DELETE FROM pending_facts
+        WHERE id = (SELECT id FROM pending_facts ORDER BY created_at FOR UPDATE SKIP LOCKED LIMIT 1)
+        RETURNING title, content, content_hash, topic_category, simhash, topic_hint
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            while True:
+                cur.execute(pop_sql)
+                row = cur.fetchone()
+                if row is None:
+                    return None
+                cur.execute(
+                    "SELECT 1 FROM sent_facts WHERE COALESCE(tenant_id, 0) = 0 AND (title = %s OR content_hash = %s) LIMIT 1",
+                    (row[0], row[2]),
+                )
+                if cur.fetchone() is not None:
+                    logger.warning("[DB] Dropping stale buffered fact: '%s'", row[0])
+                    continue
+                # Undone if a job for the same fact turns up, so the entry is dropped rather than
+                # failing the transaction and leaving it at the head of the buffer for every run
+                cur.execute("SAVEPOINT buffered_fact")
+                cur.execute(
+                    "INSERT INTO sent_facts (title, content, content_hash, topic_category, simhash, topic_hint) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)",
+                    row,
+                )
+                cur.execute(
+                    f"""
+                    INSERT INTO pipeline_jobs (idempotency_key, stage, title, content, content_hash,
+                                               topic_category, simhash, topic_hint, leased_until)
+                    VALUES (%s, 'persisted', %s, %s, %s, %s, %s, %s, NOW() + %s * INTERVAL '1 second')
+                    ON CONFLICT (idempotency_key) DO NOTHING
+                    RETURNING {_JOB_COLUMNS}
+                    """,
+                    (_idempotency_key(None, row[2]), *row, lease_seconds),
+                )
+                job = cur.fetchone()
+                if job is None:
+                    cur.execute("ROLLBACK TO SAVEPOINT buffered_fact")
+                    logger.warning("[DB] Dropping buffered fact already tracked by a job: '%s'", row[0])
+                    continue
+                break
+    _count_inserted(1)
+    logger.info("[DB] Fact saved from buffer: '%s'", row[0])
+    return job
+
+
+def buffered_count() -> int:
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM pending_facts")
+            return cur.fetchone()[0]
+
+
+_JOB_COLUMNS = ("id, COALESCE(tenant_id, 0), stage, title, content, content_hash, topic_category, simhash, "
+                "delivered_to, attempts, topic_hint")
+
+
+def _idempotency_key(tenant_id: int | None, content_hash: str) -> str:
+    return f"{_tenant_key(tenant_id)}:{content_hash}"
+
+
+def create_job(title: str, content: str, content_hash: str, topic_category: str, simhash: int | None = None,
+               tenant_id: int | None = None, lease_seconds: int = 600, topic_hint: str | None = None) -> tuple | None:
+    """
+    Record a freshly generated fact as a leased job at stage 'generated'.
+    Returns the job row, or None if a job for the same tenant and content_hash exists.
+    """
+    sql = f"""
+        INSERT INTO pipeline_jobs (idempotency_key, tenant_id, title, content, content_hash, topic_category,
+                                   simhash, topic_hint, leased_until)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW() + %s * INTERVAL '1 second')
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING {_JOB_COLUMNS}
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (_idempotency_key(tenant_id, content_hash), tenant_id, title, content, content_hash,
+                              topic_category, simhash, topic_hint, lease_seconds))
+            return cur.fetchone()
+
+
+def claim_jobs(tenant_ids: list[int | None], lease_seconds: int = 600) -> list[tuple]:
+    """
+    Lease the oldest unfinished job of each given tenant whose previous lease has
+    expired (its worker crashed or gave up). Rows another worker is claiming
+    right now are skipped, so concurrent callers never get the same job.
+    """
+    sql = f"""
+        WITH open AS (
+            SELECT id, COALESCE(tenant_id, 0) AS tenant_key FROM pipeline_jobs
+            WHERE stage IN ('generated', 'persisted')
+              AND COALESCE(tenant_id, 0) = ANY(%s)
+              AND (leased_until IS NULL OR leased_until < NOW())
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE pipeline_jobs
+        SET leased_until = NOW() + %s * INTERVAL '1 second', attempts = attempts + 1, updated_at = NOW()
+        WHERE id IN (SELECT MIN(id) FROM open GROUP BY tenant_key)
+        RETURNING {_JOB_COLUMNS}
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, ([_tenant_key(t) for t in tenant_ids], lease_seconds))
+            return cur.fetchall()
+
+
+def persist_job(job_id: int) -> bool:
+    """
+    Copy a 'generated' job into sent_facts and advance it to 'persisted', atomically and idempotently.
+    If sent_facts already holds the fact without this job (older rows, imports, another writer),
+    the job is closed as 'duplicate' instead and False is returned: it must not be delivered.
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO sent_facts (title, content, content_hash, topic_category, simhash, tenant_id, topic_hint)
+                SELECT title, content, content_hash, topic_category, simhash, tenant_id, topic_hint
+                FROM pipeline_jobs WHERE id = %s AND stage = 'generated'
+                ON CONFLICT ((COALESCE(tenant_id, 0)), content_hash) DO NOTHING
+            """, (job_id,))
+            inserted = cur.rowcount
+            cur.execute("""
+                UPDATE pipeline_jobs
+                SET stage = CASE WHEN %s > 0 THEN 'persisted' ELSE 'duplicate' END,
+                    leased_until = CASE WHEN %s > 0 THEN leased_until END,
+                    last_error = CASE WHEN %s > 0 THEN last_error ELSE 'already in sent_facts' END,
+                    updated_at = NOW()
+                WHERE id = %s AND stage = 'generated'
+                RETURNING stage
+            """, (inserted, inserted, inserted, job_id))
+            row = cur.fetchone()
+    _count_inserted(inserted)
+    # No row: the job had already moved past 'generated', so it was persisted earlier
+    return row is None or row[0] == "persisted"
+
+
+def record_delivery(job_id: int, recipients: list[str], done: bool = False, lease_seconds: int = 600):
+    """
+    Add recipients to the job's delivered_to and renew its lease for another
+    lease_seconds; with done=True the job is finished and the lease released.
+    """
+    sql = """
+        UPDATE pipeline_jobs
+        SET delivered_to = ARRAY(SELECT DISTINCT unnest(delivered_to || %(recipients)s::text[])),
+            stage = CASE WHEN %(done)s THEN 'delivered' ELSE stage END,
+            leased_until = CASE WHEN %(done)s THEN NULL ELSE NOW() + %(lease)s * INTERVAL '1 second' END,
+            updated_at = NOW()
+        WHERE id = %(id)s
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {"id": job_id, "recipients": recipients, "done": done, "lease": lease_seconds})
+
+
+def release_job(job_id: int, error: str, max_attempts: int) -> str:
+    """
+    Give a job back after a failed attempt so the next run resumes it; after
+    max_attempts it is marked 'failed' instead. Returns the job's new stage.
+    """
+    sql = """
+        UPDATE pipeline_jobs
+        SET leased_until = NULL, last_error = %s, updated_at = NOW(),
+            stage = CASE WHEN attempts >= %s THEN 'failed' ELSE stage END
+        WHERE id = %s
+        RETURNING stage
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (error[:2000], max_attempts, job_id))
+            row = cur.fetchone()
+            return row[0] if row else "failed"
 
 
-def get_previous_titles() -> list[str]:
-    """Return all previously sent fact titles."""
-    with get_connection() as conn:
+def topic_coverage() -> list[tuple]:
+    """
+    (tenant key, topic_hint, topic_category, facts, last sent as epoch seconds)
+    per group of sent and buffered facts; buffered ones count for the default audience.
+    """
+    sql = """
+        SELECT tenant_key, topic_hint, topic_category, COUNT(*), EXTRACT(EPOCH FROM MAX(at))::float8
+        FROM (
+            SELECT COALESCE(tenant_id, 0) AS tenant_key, topic_hint, topic_category, sent_at AS at FROM sent_facts
+            UNION ALL
+            SELECT 0, topic_hint, topic_category, created_at FROM pending_facts
+        ) AS facts
+        GROUP BY tenant_key, topic_hint, topic_category
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            return cur.fetchall()
+
+
+def get_topic_dup_rates() -> list[tuple[int, str, float]]:
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT tenant_key, topic, dup_rate FROM topic_stats")
+            return cur.fetchall()
+
+
+def record_topic_outcomes(outcomes: list[tuple[int | None, str, int, float, float]]):
+    """
+    Fold batches of dedup outcomes into the topics' duplicate-rate EWMAs (starting from 0), one round trip.
+    Each entry is (tenant_id, topic, samples, decay, increment): the batch turns a stored rate r into
+    r * decay + increment, which is the same as applying its outcomes one at a time.
+    """
+    sql = """
+        INSERT INTO topic_stats (tenant_key, topic, dup_rate, samples)
+        VALUES (%(tenant)s, %(topic)s, %(increment)s, %(samples)s)
+        ON CONFLICT (tenant_key, topic) DO UPDATE
+        SET dup_rate = topic_stats.dup_rate * %(decay)s + %(increment)s,
+            samples = topic_stats.samples + %(samples)s,
+            updated_at = NOW()
+    """
+    rows = [{"tenant": _tenant_key(tenant_id), "topic": topic, "samples": samples,
+             "decay": decay, "increment": increment}
+            for tenant_id, topic, samples, decay, increment in outcomes]
+    with connection() as conn:
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_batch(cur, sql, rows, page_size=500)
+
+
+# COPY options that pass one JSON document per line through untouched: CSV with a
+# delimiter and quote character JSON never contains unescaped, so nothing gets quoted
+_JSON_LINES_COPY = "WITH (FORMAT csv, DELIMITER E'\\x02', QUOTE E'\\x01')"
+
+# Plain indexes on sent_facts that a bulk import may drop and rebuild, as defined in _SCHEMA_DDL;
+# the unique (tenant, content_hash) index stays, imports rely on it to skip facts already present
+SENT_FACTS_BULK_INDEXES = {
+    "idx_sent_facts_title": "sent_facts (title)",
+    "idx_sent_facts_sent_at": "sent_facts (sent_at DESC)",
+    "idx_sent_facts_tenant_title": "sent_facts ((COALESCE(tenant_id, 0)), title)",
+    "idx_sent_facts_tenant_sent_at": "sent_facts ((COALESCE(tenant_id, 0)), sent_at DESC)",
+}
+
+
+def export_facts(out) -> int:
+    """
+    Stream every sent fact, oldest first, as one JSON object per line into
+    out.write() using COPY, so memory use does not grow with the table.
+    Tenants are written by name. Returns the number of rows.
+    """
+    sql = f"""
+        COPY (
+            SELECT row_to_json(f) FROM (
+                SELECT s.id, s.title, s.content, s.content_hash, s.topic_category, s.topic_hint, s.simhash,
+                       t.name AS tenant, s.sent_at
+                FROM sent_facts s LEFT JOIN tenants t ON t.id = s.tenant_id
+                ORDER BY s.sent_at
+            ) AS f
+        ) TO STDOUT {_JSON_LINES_COPY}
+    """
+    with connection() as conn:
         with conn.cursor() as cur:
-            cur.execute("SELECT title FROM sent_facts ORDER BY sent_at DESC")
+            cur.copy_expert(sql, out)
+            return cur.rowcount
+
+
+def import_facts(source, rebuild_indexes: bool = False) -> dict:
+    """
+    Bulk-load facts written by export_facts from source.read(), in one transaction:
+    COPY into a staging table, create missing tenants (inactive, so nobody gets
+    mailed), then a single INSERT … SELECT that recomputes content_hash from the
+    content and skips facts the target already has.
+    With rebuild_indexes, SENT_FACTS_BULK_INDEXES are dropped for the load and
+    recreated before the commit, so an aborted import leaves them in place (but
+    sent_facts stays locked until it finishes).
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            if rebuild_indexes:
+                cur.execute("DROP INDEX IF EXISTS " + ", ".join(SENT_FACTS_BULK_INDEXES))
+            cur.execute("CREATE TEMP TABLE fact_import (doc JSON NOT NULL) ON COMMIT DROP")
+            cur.copy_expert(f"COPY fact_import (doc) FROM STDIN {_JSON_LINES_COPY}", source, size=1 << 20)
+            staged = cur.rowcount
+            cur.execute("""
+                INSERT INTO tenants (name, active)
+                SELECT DISTINCT doc->>'tenant', FALSE FROM fact_import WHERE doc->>'tenant' IS NOT NULL
+                ON CONFLICT (name) DO NOTHING
+            """)
+            tenants_created = cur.rowcount
+            # convert_to() is not immutable, so the hash can't be a generated column of the staging table
+            cur.execute("""
+                WITH staged AS (
+                    SELECT doc, encode(sha256(convert_to(doc->>'content', 'UTF8')), 'hex') AS content_hash
+                    FROM fact_import
+                ), inserted AS (
+                    INSERT INTO sent_facts (id, title, content, content_hash, topic_category, topic_hint, simhash,
+                                            tenant_id, sent_at)
+                    SELECT (i.doc->>'id')::uuid, i.doc->>'title', i.doc->>'content', i.content_hash,
+                           i.doc->>'topic_category', i.doc->>'topic_hint', (i.doc->>'simhash')::bigint,
+                           t.id, (i.doc->>'sent_at')::timestamp
+                    FROM staged i
+                    LEFT JOIN tenants t ON t.name = i.doc->>'tenant'
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM inserted),
+                       COUNT(*) FILTER (WHERE doc->>'content_hash' IS DISTINCT FROM content_hash)
+                FROM staged
+            """)
+            inserted, rehashed = cur.fetchone()
+            if rebuild_indexes:
+                started = time.monotonic()
+                for name, definition in SENT_FACTS_BULK_INDEXES.items():
+                    cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+                logger.info("[DB] Rebuilt sent_facts indexes in %.1fs", time.monotonic() - started)
+            cur.execute("ANALYZE sent_facts")
+    _count_inserted(inserted)
+    return {"staged": staged, "inserted": inserted, "skipped": staged - inserted,
+            "rehashed": rehashed, "tenantsCreated": tenants_created}
+
+
+def get_tenants(schedule: str | None = None) -> list[tuple]:
+    """Active tenants as (id, name, topics, schedule, subject_prefix, recipients), optionally for one schedule."""
+    sql = """
+        SELECT t.id, t.name, COALESCE(t.topics, '{}'), t.schedule, t.subject_prefix,
+               COALESCE(array_agg(s.email ORDER BY s.email) FILTER (WHERE s.email IS NOT NULL), '{}')
+        FROM tenants t
+        LEFT JOIN subscribers s ON s.tenant_id = t.id
+        WHERE t.active AND (%(schedule)s::text IS NULL OR t.schedule = %(schedule)s)
+        GROUP BY t.id
+        ORDER BY t.id
+    """
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {"schedule": schedule})
+            return cur.fetchall()
+
+
+def get_tenant_schedules() -> list[str]:
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT DISTINCT schedule FROM tenants WHERE active ORDER BY schedule")
             return [row[0] for row in cur.fetchall()]
 
 
+def iter_titles(batch_size: int = 1000):
+    """Stream every sent fact title, newest first, for callers that need the full history."""
+    for (title,) in _stream("SELECT title FROM sent_facts ORDER BY sent_at DESC", batch_size=batch_size):
+        yield title
+
+
 def total_facts() -> int:
-    with get_connection() as conn:
+    with connection() as conn:
         with conn.cursor() as cur:
             cur.execute("SELECT COUNT(*) FROM sent_facts")
             return cur.fetchone()[0]
+
+
+# Cached row count of sent_facts for health checks: recounted now and then by
+# refresh_fact_count(), and bumped in between by every insert this process makes
+_fact_count: int | None = None
+_fact_counted_at: float | None = None
+_fact_count_lock = threading.Lock()
+
+
+def _count_inserted(rows: int):
+    global _fact_count
+    with _fact_count_lock:
+        if _fact_count is not None:
+            _fact_count += rows
+
+
+def refresh_fact_count() -> int:
+    global _fact_count, _fact_counted_at
+    total = total_facts()
+    with _fact_count_lock:
+        _fact_count, _fact_counted_at = total, time.monotonic()
+    return total
+
+
+def cached_fact_count() -> tuple[int | None, float | None]:
+    """(count, seconds since the last full recount); (None, None) before the first recount."""
+    with _fact_count_lock:
+        if _fact_counted_at is None:
+            return None, None
+        return _fact_count, time.monotonic() - _fact_counted_at
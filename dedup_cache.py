@@ -0,0 +1,81 @@
+"""
+In-process dedup cache.
+
+Holds a 64-bit fingerprint of every sent or buffered content_hash and title,
+so duplicates are caught without a database round trip:
+
+  - fingerprint hit → duplicate (facts are never deleted)
+  - miss            → unknown, confirm against the DB
+
+A miss only means this process has not seen the fact: the server, one-shot
+runs and archive imports all write sent_facts, so the DB has the last word.
+Titles are keyed exactly as stored, the way database.find_new compares them.
+"""
+import sys
+import time
+import hashlib
+import logging
+import threading
+
+import database
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_fingerprints: set[int] | None = None
+_stats = {"checks": 0, "hits": 0, "misses": 0}
+
+
+def _keys(title: str, content_hash: str, tenant_id: int | None = None) -> tuple[bytes, bytes]:
+    # Keys are namespaced per tenant (0 = default audience) so histories never mix
+    prefix = f"{tenant_id or 0}:".encode()
+    return prefix + b"t:" + title.encode(), prefix + b"h:" + content_hash.encode()
+
+
+def _fingerprint(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def load():
+    """(Re)build the cache from every row in sent_facts and pending_facts."""
+    global _fingerprints
+    started = time.monotonic()
+    fingerprints = set()
+    for tenant_key, title, content_hash in database.iter_dedup_keys():
+        fingerprints.update(_fingerprint(key) for key in _keys(title, content_hash, tenant_key))
+
+    with _lock:
+        _fingerprints = fingerprints
+    logger.info("[DedupCache] Loaded %d keys in %.2fs — %s", len(fingerprints), time.monotonic() - started, stats())
+
+
+def check(title: str, content_hash: str, tenant_id: int | None = None) -> bool | None:
+    """True = duplicate, None = unknown (ask the DB)."""
+    with _lock:
+        if _fingerprints is None:
+            return None
+        _stats["checks"] += 1
+        if any(_fingerprint(k) in _fingerprints for k in _keys(title, content_hash, tenant_id)):
+            _stats["hits"] += 1
+            return True
+        _stats["misses"] += 1
+        return None
+
+
+def add(title: str, content_hash: str, tenant_id: int | None = None):
+    with _lock:
+        if _fingerprints is None:
+            return
+        _fingerprints.update(_fingerprint(key) for key in _keys(title, content_hash, tenant_id))
+
+
+def stats() -> dict:
+    with _lock:
+        if _fingerprints is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "entries": len(_fingerprints),
+            "bytes": sys.getsizeof(_fingerprints) + 32 * len(_fingerprints),
+            **_stats,
+        }
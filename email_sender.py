@@ -1,120 +1,487 @@
+from __future__ import annotations
+
 import os
-import smtplib
+import time
+import queue
 import logging
+import threading
 import re
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable
 from fact_generator import GeneratedFact
+import metrics
+
+# smtplib and email.mime are imported on first send, keeping them off the startup path
+if TYPE_CHECKING:
+    import smtplib
 
 logger = logging.getLogger(__name__)
 
 
-def send(fact: GeneratedFact):
-    sender = os.getenv("MAIL_SENDER")
-    password = os.getenv("MAIL_APP_PASSWORD")
-    raw_recipients = os.getenv("MAIL_RECIPIENT", "")
+class DeliveryError(Exception):
+    """Some recipients could not be delivered to; `failed` maps address → last error."""
+
+    def __init__(self, failed: dict[str, str], delivered: list[str]):
+        self.failed = failed
+        self.delivered = delivered
+        super().__init__(f"{len(failed)} recipient(s) failed: " + ", ".join(f"{r} ({e})" for r, e in failed.items()))
+
+    @property
+    def retryable(self) -> list[str]:
+        """Failed recipients worth another attempt: everything but permanent (5xx) errors."""
+        return [r for r, e in self.failed.items() if not _permanent(e)]
+
+
+class SessionError(Exception):
+    """Connecting to or logging in at the SMTP server failed; `error` is "<code> <reason>" or "connection: …"."""
+
+    def __init__(self, error: str):
+        self.error = error
+        super().__init__(error)
+
+
+def _permanent(error: str) -> bool:
+    return error.startswith("5")
+
+
+class _Session:
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.next_send_at = 0.0
+
+
+class SMTPPool:
+    """
+    Small pool of authenticated SMTP sessions kept open between sends.
+    Each session is rate-limited to `rate` messages/second and NOOP-checked
+    before reuse once it has been idle for `check_after` seconds.
+    """
+
+    def __init__(self, host: str, port: int, size: int, sender: str, password: str, rate: float,
+                 check_after: float = 30, starttls: bool = True):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.size = size
+        self.sender = sender
+        self.password = password
+        self.min_interval = 1 / rate if rate > 0 else 0.0
+        self.check_after = check_after
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> _Session:
+        import smtplib
+        smtp = None
+        try:
+            with metrics.timer("email_smtp_connect_seconds"):
+                smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+                smtp.ehlo()
+                if self.starttls:
+                    smtp.starttls()
+                if self.password:
+                    smtp.login(self.sender, self.password)
+        except smtplib.SMTPResponseException as e:
+            if smtp is not None:
+                _quit_quietly(smtp)
+            raise SessionError(_describe(e.smtp_code, e.smtp_error)) from e
+        except (smtplib.SMTPException, OSError) as e:
+            if smtp is not None:
+                _quit_quietly(smtp)
+            raise SessionError(f"connection: {e}") from e
+        return _Session(smtp)
+
+    @contextmanager
+    def session(self):
+        import smtplib
+        self._slots.acquire()
+        session = None
+        try:
+            try:
+                session = self._idle.get_nowait()
+                if time.monotonic() - session.last_used > self.check_after and not _alive(session.smtp):
+                    _quit_quietly(session.smtp)
+                    session = self._connect()
+            except queue.Empty:
+                session = self._connect()
+            yield session
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Don't hand a dead session back to the pool
+            session = None
+            raise
+        finally:
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._idle.put(session)
+            self._slots.release()
+
+    def send_one(self, session: _Session, recipient: str, payload: str):
+        wait = session.next_send_at - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        session.next_send_at = time.monotonic() + self.min_interval
+        session.smtp.sendmail(self.sender, [recipient], f"To: {recipient}\n{payload}")
+
+    def close(self):
+        while True:
+            try:
+                _quit_quietly(self._idle.get_nowait().smtp)
+            except queue.Empty:
+                return
+
+
+def _alive(smtp: smtplib.SMTP) -> bool:
+    import smtplib
+    try:
+        return smtp.noop()[0] == 250
+    except smtplib.SMTPException:
+        return False
+
+
+def _quit_quietly(smtp: smtplib.SMTP):
+    try:
+        smtp.quit()
+    except Exception:
+        pass
+
+
+_pool: SMTPPool | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> SMTPPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPPool(
+                host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+                port=int(os.getenv("SMTP_PORT", "587")),
+                size=int(os.getenv("SMTP_POOL_SIZE", "2")),
+                sender=os.getenv("MAIL_SENDER"),
+                password=os.getenv("MAIL_APP_PASSWORD"),
+                rate=float(os.getenv("SMTP_RATE_PER_CONN", "5")),
+                # Plain, unauthenticated sessions are only for local relays / test sinks
+                starttls=os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes"),
+            )
+        return _pool
+
+
+def close():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
 
+
+def recipients_from_env() -> list[str]:
     # Support comma-separated list of recipients in the secret
-    recipients = [r.strip() for r in raw_recipients.split(",") if r.strip()]
+    raw_recipients = os.getenv("MAIL_RECIPIENT", "")
+    return [r.strip() for r in raw_recipients.split(",") if r.strip()]
+
+
+DEFAULT_SUBJECT_PREFIX = "☕ Java Fact of the Day"
+DEFAULT_SCHEDULE = "30 3 * * *"   # crontab (UTC) of the default audience's run: 9:00 AM IST
+
+
+def send(fact: GeneratedFact, recipients: list[str] | None = None,
+         subject_prefix: str = DEFAULT_SUBJECT_PREFIX, schedule: str = DEFAULT_SCHEDULE,
+         on_progress: Callable[[list[str]], None] | None = None) -> list[str]:
+    """
+    Deliver one individually addressed message per recipient over pooled SMTP
+    sessions, in batches. Recipients that fail are retried on their own; any
+    still failing are reported through DeliveryError. Returns delivered addresses.
+    subject_prefix and schedule (the audience's crontab, UTC) also head and sign the email.
+    on_progress, if given, is called on this thread with each finished batch's
+    delivered addresses, so a caller can checkpoint while the send goes on.
+    """
+    if recipients is None:
+        recipients = recipients_from_env()
     if not recipients:
         raise ValueError("MAIL_RECIPIENT is empty — set a comma-separated list of email addresses")
 
-    logger.info("[Email] Sending '%s' to %d recipient(s): %s", fact.title, len(recipients), ", ".join(recipients))
+    started = time.perf_counter()
+    pool = _get_pool()
+    logger.info("[Email] Sending '%s' to %d recipient(s)", fact.title, len(recipients))
+
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
 
     msg = MIMEMultipart("alternative")
-    msg["Subject"] = f"☕ Java Fact of the Day: {fact.title}"
-    msg["From"] = sender
-    msg["To"] = ", ".join(recipients)
+    msg["Subject"] = f"{subject_prefix}: {fact.title}"
+    msg["From"] = pool.sender
 
-    html_body = _build_html(fact)
+    html_body = _build_html(fact, subject_prefix, schedule)
     msg.attach(MIMEText(html_body, "html"))
+    payload = msg.as_string()   # rendered once; each recipient only gets its own To: header
+
+    batch_size = max(1, int(os.getenv("SMTP_BATCH_SIZE", "50")))
+    retries = int(os.getenv("SMTP_RECIPIENT_RETRIES", "2"))
+    delivered: list[str] = []
+    failed: dict[str, str] = {}
 
-    with smtplib.SMTP("smtp.gmail.com", 587) as server:
-        server.ehlo()
-        server.starttls()
-        server.login(sender, password)
-        server.sendmail(sender, recipients, msg.as_string())
+    pending = list(recipients)
+    fatal: list[str] = []   # set once the server refuses us outright (e.g. 535 bad login)
+    for attempt in range(retries + 1):
+        if attempt:
+            logger.warning("[Email] Retrying %d failed recipient(s) (attempt %d/%d)", len(pending), attempt, retries)
+            time.sleep(min(2 ** attempt, 30))
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        with ThreadPoolExecutor(max_workers=min(pool.size, len(batches))) as executor:
+            futures = [executor.submit(_send_batch, pool, b, payload, fatal) for b in batches]
+            for future in as_completed(futures):
+                ok, errors = future.result()
+                delivered.extend(ok)
+                for r in ok:
+                    failed.pop(r, None)
+                failed.update(errors)
+                if on_progress is not None and ok:
+                    on_progress(ok)
+        if fatal:
+            logger.error("[Email] SMTP server refused the session (%s) — not retrying", fatal[0])
+            break
+        # Permanent (5xx) rejections are not worth retrying
+        pending = [r for r in pending if r in failed and not _permanent(failed[r])]
+        if not pending:
+            break
 
-    logger.info("[Email] Delivered successfully to %d recipient(s): '%s'", len(recipients), fact.title)
+    logger.info("[Email] Delivered to %d/%d recipient(s): '%s'", len(delivered), len(recipients), fact.title)
+    metrics.observe("email_send_seconds", time.perf_counter() - started)
+    metrics.inc("email_recipients_total", len(delivered), outcome="delivered")
+    metrics.inc("email_recipients_total", len(failed), outcome="failed")
+    if failed:
+        raise DeliveryError(failed, delivered)
+    return delivered
 
 
-def _build_html(fact: GeneratedFact) -> str:
-    html_content = _markdown_to_html(fact.content)
-    return f"""<!DOCTYPE html>
+def _send_batch(pool: SMTPPool, batch: list[str], payload: str,
+                fatal: list[str]) -> tuple[list[str], dict[str, str]]:
+    """
+    Send to one batch over pooled sessions. A session that cannot be opened
+    fails the rest of the batch at once (one connect/login per batch, not per
+    recipient); a 5xx refusal is also recorded in `fatal` so the other batches
+    and the retries don't try again.
+    """
+    import smtplib
+    ok: list[str] = []
+    errors: dict[str, str] = {}
+    remaining = list(batch)
+    while remaining:
+        if fatal:
+            errors.update((r, fatal[0]) for r in remaining)
+            break
+        try:
+            with pool.session() as session:
+                while remaining:
+                    recipient = remaining[0]
+                    try:
+                        pool.send_one(session, recipient, payload)
+                        ok.append(recipient)
+                    except smtplib.SMTPRecipientsRefused as e:
+                        errors[recipient] = _describe(*e.recipients.get(recipient, (0, b"refused")))
+                    except smtplib.SMTPResponseException as e:
+                        errors[recipient] = _describe(e.smtp_code, e.smtp_error)
+                    remaining.pop(0)
+        except SessionError as e:
+            if _permanent(e.error):
+                fatal.append(e.error)
+            errors.update((r, e.error) for r in remaining)
+            break
+        except (smtplib.SMTPException, OSError) as e:
+            # Session dropped mid-batch: fail this recipient, carry on with a fresh session
+            errors[remaining.pop(0)] = f"connection: {e}"
+    return ok, errors
+
+
+def _describe(code: int, reason) -> str:
+    if isinstance(reason, bytes):
+        reason = reason.decode(errors="replace")
+    return f"{code} {reason}"
+
+
+# ── HTML rendering ─────────────────────────────────────────────────────────
+# Static parts of the email shell, split around its dynamic slots: heading, category, body, schedule
+_HTML_HEAD = """<!DOCTYPE html>
 <html lang="en">
 <head>
   <meta charset="UTF-8"/>
   <style>
-    body      {{ font-family: 'Segoe UI', Arial, sans-serif; background:#f5f5f5; margin:0; padding:0; }}
-    .card     {{ max-width:680px; margin:32px auto; background:#ffffff;
-                border-radius:10px; box-shadow:0 2px 10px rgba(0,0,0,.12); overflow:hidden; }}
-    .header   {{ background:#1a1a2e; color:#e0e0e0; padding:22px 28px; }}
-    .header h1{{ margin:0; font-size:18px; font-weight:600; }}
-    .badge    {{ display:inline-block; margin-top:8px; background:#16213e;
-                color:#a3cef1; font-size:12px; padding:3px 10px; border-radius:20px; }}
-    .body     {{ padding:28px; color:#222; line-height:1.7; font-size:15px; }}
-    .body h2  {{ color:#1a1a2e; font-size:17px; margin-top:0; }}
-    pre       {{ background:#1e1e2e; color:#cdd6f4; padding:16px; border-radius:6px;
-                overflow-x:auto; font-size:13px; line-height:1.5; }}
-    code      {{ background:#eef0f5; padding:2px 6px; border-radius:4px; font-size:13px; }}
-    .prod-tip {{ background:#fff8e1; border-left:4px solid #f9a825; padding:10px 14px;
-                border-radius:4px; margin-top:16px; font-size:14px; }}
-    .footer   {{ background:#f0f0f0; text-align:center; padding:14px;
-                font-size:12px; color:#888; }}
+    body      { font-family: 'Segoe UI', Arial, sans-serif; background:#f5f5f5; margin:0; padding:0; }
+    .card     { max-width:680px; margin:32px auto; background:#ffffff;
+                border-radius:10px; box-shadow:0 2px 10px rgba(0,0,0,.12); overflow:hidden; }
+    .header   { background:#1a1a2e; color:#e0e0e0; padding:22px 28px; }
+    .header h1{ margin:0; font-size:18px; font-weight:600; }
+    .badge    { display:inline-block; margin-top:8px; background:#16213e;
+                color:#a3cef1; font-size:12px; padding:3px 10px; border-radius:20px; }
+    .body     { padding:28px; color:#222; line-height:1.7; font-size:15px; }
+    .body h2  { color:#1a1a2e; font-size:17px; margin-top:0; }
+    .body h3  { color:#1a1a2e; font-size:15px; margin:14px 0 4px; }
+    .body ul, .body ol { margin:4px 0; padding-left:22px; }
+    a         { color:#1565c0; }
+    pre       { background:#1e1e2e; color:#cdd6f4; padding:16px; border-radius:6px;
+                overflow-x:auto; font-size:13px; line-height:1.5; }
+    code      { background:#eef0f5; padding:2px 6px; border-radius:4px; font-size:13px; }
+    pre code  { background:none; padding:0; }
+    .prod-tip { background:#fff8e1; border-left:4px solid #f9a825; padding:10px 14px;
+                border-radius:4px; margin-top:16px; font-size:14px; }
+    .footer   { background:#f0f0f0; text-align:center; padding:14px;
+                font-size:12px; color:#888; }
   </style>
 </head>
 <body>
   <div class="card">
     <div class="header">
-      <h1>☕ Java / Spring Boot — Daily Fact</h1>
-      <span class="badge">📂 {fact.topic_category}</span>
+      <h1>"""
+_HTML_BADGE = """</h1>
+      <span class="badge">📂 """
+_HTML_MIDDLE = """</span>
     </div>
     <div class="body">
-      {html_content}
+      """
+_HTML_TAIL = """
     </div>
     <div class="footer">
-      Delivered by Java Fact Agent &middot; Runs daily at 9:00 AM IST
+      Delivered by Java Fact Agent &middot; """
+_HTML_END = """
     </div>
   </div>
 </body>
 </html>"""
 
+_CODE_FENCE = re.compile(r"^\s*```\s*([\w+#.-]*)")
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_BULLET = re.compile(r"^\s*[-*+]\s+(.*)$")
+_ORDERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+# One pass over already-escaped text; earlier alternatives win, so nothing inside `code` is formatted
+_INLINE = re.compile(
+    r"`([^`]+)`"                                   # 1: inline code
+    r"|\*\*(.+?)\*\*"                              # 2: bold
+    r"|\[([^\]]+)\]\((https?://[^\s)]+)\)"          # 3, 4: [text](url)
+    r"|(?<![\w/\"=])(https?://[^\s<)]*[^\s<).,;:!?])"  # 5: bare URL, minus trailing punctuation
+    r"|(?<![\w*])\*(?![\s*])(.+?)(?<![\s*])\*(?![\w*])"  # 6: italic
+)
+
+_render_cache: OrderedDict[tuple[str, str, str], str] = OrderedDict()
+_render_lock = threading.Lock()
+
+
+def _describe_schedule(schedule: str) -> str:
+    """Footer wording for a crontab schedule (UTC)."""
+    if schedule == DEFAULT_SCHEDULE:
+        return "Runs daily at 9:00 AM IST"
+    fields = schedule.split()
+    if len(fields) == 5 and fields[0].isdigit() and fields[1].isdigit() and fields[2:] == ["*", "*", "*"]:
+        return f"Runs daily at {int(fields[1]):02d}:{int(fields[0]):02d} UTC"
+    return f"Runs on the schedule {schedule} (UTC)"
+
+
+def _build_html(fact: GeneratedFact, subject_prefix: str = DEFAULT_SUBJECT_PREFIX,
+                schedule: str = DEFAULT_SCHEDULE) -> str:
+    """Render the full email, cached per content_hash and audience look so retries never re-render."""
+    key = (fact.content_hash, subject_prefix, schedule)
+    with _render_lock:
+        html = _render_cache.get(key)
+        if html is not None:
+            _render_cache.move_to_end(key)
+            return html
+
+    html = "".join((_HTML_HEAD, _escape(subject_prefix), _HTML_BADGE, _escape(fact.topic_category), _HTML_MIDDLE,
+                    _markdown_to_html(fact.content), _HTML_TAIL, _escape(_describe_schedule(schedule)), _HTML_END))
+
+    with _render_lock:
+        _render_cache[key] = html
+        while len(_render_cache) > int(os.getenv("EMAIL_RENDER_CACHE_SIZE", "64")):
+            _render_cache.popitem(last=False)
+    return html
+
 
 def _markdown_to_html(markdown: str) -> str:
-    lines = markdown.split("\n")
     html = []
-    in_code = False
+    code_lines: list[str] | None = None
+    code_open = ""
+    list_tag = None
+
+    def close_list():
+        nonlocal list_tag
+        if list_tag:
+            html.append(f"</{list_tag}>")
+            list_tag = None
 
-    for line in lines:
-        if line.startswith("```"):
-            if not in_code:
-                html.append("<pre><code>")
-                in_code = True
+    for line in markdown.split("\n"):
+        fence = _CODE_FENCE.match(line)
+        if fence:
+            if code_lines is None:
+                close_list()
+                code_lines = []
+                lang = fence.group(1)
+                code_open = f'<pre><code class="language-{lang}">' if lang else "<pre><code>"
             else:
-                html.append("</code></pre>")
-                in_code = False
+                html.append(code_open + "\n".join(code_lines) + "</code></pre>")
+                code_lines = None
+            continue
+
+        if code_lines is not None:
+            code_lines.append(_escape(line))
             continue
 
-        if in_code:
-            html.append(_escape(line))
+        item = _BULLET.match(line)
+        tag = "ul"
+        if not item:
+            item = _ORDERED.match(line)
+            tag = "ol"
+        if item:
+            if list_tag != tag:
+                close_list()
+                html.append(f"<{tag}>")
+                list_tag = tag
+            html.append(f"<li>{_inline(item.group(1))}</li>")
             continue
+        close_list()
 
-        if line.startswith("## "):
-            html.append(f"<h2>{_escape(line[3:])}</h2>")
-        elif line.startswith("# "):
-            html.append(f"<h2>{_escape(line[2:])}</h2>")
+        heading = _HEADING.match(line)
+        if heading:
+            level = "h2" if len(heading.group(1)) <= 2 else "h3"
+            html.append(f"<{level}>{_inline(heading.group(2))}</{level}>")
         elif line.lower().startswith("why this matters"):
             html.append(f'<div class="prod-tip">💡 <strong>{_escape(line)}</strong></div>')
         elif line.strip() == "":
             html.append("<br/>")
         else:
-            # Inline bold + code
-            formatted = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", line)
-            formatted = re.sub(r"`([^`]+)`", r"<code>\1</code>", formatted)
-            html.append(f"<p style='margin:4px 0'>{formatted}</p>")
+            html.append(f"<p style='margin:4px 0'>{_inline(line)}</p>")
 
+    if code_lines is not None:   # unterminated fence
+        html.append(code_open + "\n".join(code_lines) + "</code></pre>")
+    close_list()
     return "\n".join(html)
 
 
+def _inline(text: str) -> str:
+    text = _escape(text)
+    # Most prose lines have no markup at all; skip the regex for them
+    if "`" not in text and "*" not in text and "[" not in text and "://" not in text:
+        return text
+    return _INLINE.sub(_inline_match, text)
+
+
+def _inline_match(m: re.Match) -> str:
+    code, bold, link_text, link_url, bare_url, italic = m.groups()
+    if code is not None:
+        return f"<code>{code}</code>"
+    if bold is not None:
+        return f"<strong>{_INLINE.sub(_inline_match, bold)}</strong>"
+    if link_url is not None:
+        return f'<a href="{_attr(link_url)}">{link_text}</a>'
+    if bare_url is not None:
+        return f'<a href="{_attr(bare_url)}">{bare_url}</a>'
+    return f"<em>{italic}</em>"
+
+
+def _attr(s: str) -> str:
+    return s.replace('"', "&quot;")
+
+
 def _escape(s: str) -> str:
     return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
@@ -2,18 +2,15 @@ import hashlib
 import re
 import logging
 from dataclasses import dataclass
-from llm_client import generate_raw_fact
+from llm_client import generate_raw_fact, generate_raw_fact_async
 from typing import Optional
+import avoid_list
+import topic_classifier
+import topic_scheduler
+import near_dup
 
 logger = logging.getLogger(__name__)
 
-TOPIC_KEYWORDS = [
-    "GC", "Garbage Collector", "JVM", "JIT", "Memory Model",
-    "Concurrency", "Thread", "Executor", "Lock", "Volatile",
-    "Auto-configuration", "AOP", "Bean", "Transaction", "WebFlux",
-    "Reactive", "Observability", "Actuator", "Performance",
-]
-
 
 @dataclass
 class GeneratedFact:
@@ -21,16 +18,39 @@ class GeneratedFact:
     content: str
     content_hash: str
     topic_category: str
+    simhash: int = 0
+    topic_hint: str | None = None
+
+
+def generate(previous_titles: list[str] | None = None, topic: str | None = None,
+             tenant_ids: list[int] | None = None) -> GeneratedFact:
+    """
+    One LLM call. `previous_titles` are the most recent titles (newest first);
+    the prompt's avoid-list is built from them plus the history most relevant
+    to the topic hint of the given tenants. Without a topic, topic_scheduler
+    picks the one the audience needs most.
+    """
+    topic = topic or topic_scheduler.pick(1, tenant_ids=tenant_ids)[0]
+    avoid = avoid_list.build(topic, previous_titles, tenant_ids)
+    return _to_fact(generate_raw_fact(previous_titles=avoid, topic=topic), topic)
+
+
+async def generate_async(previous_titles: list[str] | None = None, topic: str | None = None,
+                         tenant_ids: list[int] | None = None) -> GeneratedFact:
+    topic = topic or topic_scheduler.pick(1, tenant_ids=tenant_ids)[0]
+    avoid = avoid_list.build(topic, previous_titles, tenant_ids)
+    return _to_fact(await generate_raw_fact_async(previous_titles=avoid, topic=topic), topic)
 
 
-def generate(previous_titles: list[str] | None = None) -> GeneratedFact:
-    raw = generate_raw_fact(previous_titles=previous_titles)
+def _to_fact(raw: str, topic_hint: str | None = None) -> GeneratedFact:
     title = _extract_title(raw)
     content_hash = hashlib.sha256(raw.encode()).hexdigest()
     category = _detect_category(raw)
+    simhash = near_dup.fingerprint(raw)
 
     logger.info("[FactGen] title='%s' category='%s' hash=%s", title, category, content_hash[:8])
-    return GeneratedFact(title=title, content=raw, content_hash=content_hash, topic_category=category)
+    return GeneratedFact(title=title, content=raw, content_hash=content_hash, topic_category=category, simhash=simhash,
+                         topic_hint=topic_hint)
 
 
 def _extract_title(raw: str) -> str:
@@ -46,8 +66,4 @@ def _extract_title(raw: str) -> str:
 
 
 def _detect_category(raw: str) -> str:
-    upper = raw.upper()
-    for keyword in TOPIC_KEYWORDS:
-        if keyword.upper() in upper:
-            return keyword
-    return "General"
+    return topic_classifier.detect_category(raw)
@@ -0,0 +1,84 @@
+"""
+Durable pipeline jobs (the pipeline_jobs table).
+
+Every fact the pipeline accepts becomes a job that moves through
+generated → persisted → delivered, with the recipients already reached kept on
+the row. A job is leased while a worker runs it; if the worker crashes or gives
+up, the lease lapses and the next run resumes the job at the stage it reached
+instead of generating a new fact or mailing anyone twice.
+
+Config (env): JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS.
+"""
+import os
+from dataclasses import dataclass, field
+
+import database
+import near_dup
+from fact_generator import GeneratedFact
+
+
+@dataclass
+class Job:
+    id: int
+    tenant_id: int | None
+    stage: str
+    fact: GeneratedFact
+    delivered_to: list[str] = field(default_factory=list)
+    attempts: int = 1
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "Job":
+        (job_id, tenant_key, stage, title, content, content_hash, topic_category, simhash, delivered_to, attempts,
+         topic_hint) = row
+        fact = GeneratedFact(
+            title=title,
+            content=content,
+            content_hash=content_hash,
+            topic_category=topic_category,
+            simhash=near_dup.to_unsigned(simhash) if simhash is not None else near_dup.fingerprint(content),
+            topic_hint=topic_hint,
+        )
+        return cls(job_id, tenant_key or None, stage, fact, list(delivered_to), attempts)
+
+
+def _lease() -> int:
+    return int(os.getenv("JOB_LEASE_SECONDS", "600"))
+
+
+def start(fact: GeneratedFact, tenant_id: int | None = None) -> Job | None:
+    """Open a job for a new fact; None if this fact is already in flight for the tenant."""
+    row = database.create_job(fact.title, fact.content, fact.content_hash, fact.topic_category,
+                              near_dup.to_signed(fact.simhash), tenant_id, _lease(), fact.topic_hint)
+    return Job.from_row(row) if row else None
+
+
+def take_buffered() -> Job | None:
+    """Pop a pre-generated fact as a job that is already persisted."""
+    row = database.take_buffered_fact(_lease())
+    return Job.from_row(row) if row else None
+
+
+def resume(tenant_ids: list[int | None]) -> dict[int | None, Job]:
+    """Claim at most one abandoned job per tenant, keyed by tenant_id (None = default audience)."""
+    jobs = [Job.from_row(row) for row in database.claim_jobs(tenant_ids, _lease())]
+    return {job.tenant_id: job for job in jobs}
+
+
+def persist(job: Job) -> bool:
+    """Record the job's fact in sent_facts; False (job closed as 'duplicate') if it was already there."""
+    job.stage = "persisted" if database.persist_job(job.id) else "duplicate"
+    return job.stage == "persisted"
+
+
+def record_delivery(job: Job, recipients: list[str], done: bool = False):
+    """Checkpoint recipients reached (none is fine) and keep the job leased to this worker."""
+    database.record_delivery(job.id, recipients, done, _lease())
+    job.delivered_to = list(dict.fromkeys(job.delivered_to + recipients))
+    if done:
+        job.stage = "delivered"
+
+
+def release(job: Job, error: Exception) -> str:
+    """Hand a failed job back for a later run to resume; returns its new stage ('failed' once out of attempts)."""
+    job.stage = database.release_job(job.id, str(error), int(os.getenv("JOB_MAX_ATTEMPTS", "3")))
+    return job.stage
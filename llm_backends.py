@@ -0,0 +1,247 @@
+"""
+Backends behind llm_client.generate_raw_fact, picked with LLM_BACKEND:
+
+  live    — call Groq (default)
+  record  — call Groq and append every prompt → response to a local store
+  replay  — answer from the store without touching the network
+  fake    — synthesize a deterministic, well-formed fact locally
+
+replay and fake sleep LLM_FAKE_LATENCY seconds per call so load tests see a
+realistic LLM stall. The store is a directory (LLM_RECORD_DIR) holding one
+JSON file per distinct request, keyed by a hash of model + messages + limits.
+A request can collect several recordings; replay hands them out in turn so a
+dedup retry with the same prompt gets a different answer, as it would live.
+With LLM_REPLAY_STRICT unset, a request that was never recorded is answered
+with the next recording from the whole store instead of failing.
+"""
+import os
+import re
+import abc
+import json
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_FOCUS = re.compile(r"Focus on: (.+?)\.(?:\n|$)")
+_PAREN = re.compile(r"\s*\(.*?\)")
+
+
+class ReplayMiss(LookupError):
+    """Strict replay was asked for a request that was never recorded."""
+
+
+def request_key(request: dict) -> str:
+    canonical = json.dumps(
+        {k: request.get(k) for k in ("model", "messages", "max_tokens", "temperature")},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _estimate_usage(request: dict, text: str) -> dict:
+    # Roughly four characters per token — close enough for metrics from offline runs
+    prompt_chars = sum(len(m["content"]) for m in request.get("messages", []))
+    return {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(text) // 4}
+
+
+class ResponseStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._keys: list[str] | None = None
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def _read(self, key: str) -> dict | None:
+        try:
+            with open(self._file(key), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def add(self, request: dict, text: str, usage: dict):
+        key = request_key(request)
+        with self._lock:
+            entry = self._read(key) or {"request": request, "responses": []}
+            entry["responses"].append({"text": text, "usage": usage})
+            os.makedirs(self.path, exist_ok=True)
+            tmp = self._file(key) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self._file(key))   # readers never see a half-written file
+            if self._keys is not None and key not in self._keys:
+                self._keys.append(key)
+
+    def responses(self, key: str) -> list[dict]:
+        entry = self._read(key)
+        return entry["responses"] if entry else []
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            if self._keys is None:
+                names = os.listdir(self.path) if os.path.isdir(self.path) else []
+                self._keys = sorted(n[:-5] for n in names if n.endswith(".json"))
+            return list(self._keys)
+
+
+class LiveBackend:
+    name = "live"
+
+    def __init__(self, get_client, get_async_client):
+        self._get_client = get_client
+        self._get_async_client = get_async_client
+
+    @staticmethod
+    def _unpack(response) -> tuple[str, dict | None]:
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            usage = {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0}
+        return response.choices[0].message.content, usage
+
+    def complete(self, request: dict) -> tuple[str, dict | None]:
+        return self._unpack(self._get_client().chat.completions.create(**request))
+
+    async def acomplete(self, request: dict) -> tuple[str, dict | None]:
+        return self._unpack(await self._get_async_client().chat.completions.create(**request))
+
+
+class RecordBackend:
+    name = "record"
+
+    def __init__(self, live: LiveBackend, store: ResponseStore):
+        self._live = live
+        self._store = store
+
+    def complete(self, request: dict) -> tuple[str, dict | None]:
+        text, usage = self._live.complete(request)
+        self._store.add(request, text, usage or _estimate_usage(request, text))
+        return text, usage
+
+    async def acomplete(self, request: dict) -> tuple[str, dict | None]:
+        text, usage = await self._live.acomplete(request)
+        await asyncio.to_thread(self._store.add, request, text, usage or _estimate_usage(request, text))
+        return text, usage
+
+
+class _LocalBackend(abc.ABC):
+    """Shared latency handling for the backends that never leave the machine."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def complete(self, request: dict) -> tuple[str, dict | None]:
+        if self.latency > 0:
+            time.sleep(self.latency)
+        return self._answer(request)
+
+    async def acomplete(self, request: dict) -> tuple[str, dict | None]:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        return self._answer(request)
+
+    @abc.abstractmethod
+    def _answer(self, request: dict) -> tuple[str, dict | None]:
+        """The (text, usage) reply to `request`."""
+
+
+class ReplayBackend(_LocalBackend):
+    name = "replay"
+
+    def __init__(self, store: ResponseStore, latency: float, strict: bool):
+        super().__init__(latency)
+        self._store = store
+        self._strict = strict
+        self._lock = threading.Lock()
+        self._served: dict[str, int] = {}
+        self._fallback = 0
+
+    def _answer(self, request: dict) -> tuple[str, dict | None]:
+        key = request_key(request)
+        responses = self._store.responses(key)
+        with self._lock:
+            if not responses:
+                keys = self._store.keys()
+                if self._strict or not keys:
+                    raise ReplayMiss(f"no recording for request {key[:12]} in {self._store.path}")
+                key = keys[self._fallback % len(keys)]
+                self._fallback += 1
+                responses = self._store.responses(key)
+            n = self._served.get(key, 0)
+            self._served[key] = n + 1
+        recorded = responses[n % len(responses)]
+        return recorded["text"], recorded.get("usage")
+
+
+class FakeBackend(_LocalBackend):
+    """Deterministic stand-in: the n-th identical request always yields the same fact."""
+
+    name = "fake"
+    _SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vo", "shi", "den", "por",
+                  "xel", "qua", "bri", "tum", "zan", "fey", "gol", "hix", "jor", "wen"]
+
+    def __init__(self, latency: float):
+        super().__init__(latency)
+        self._lock = threading.Lock()
+        self._calls: dict[str, int] = {}
+
+    def _word(self, rng: random.Random) -> str:
+        return "".join(rng.choice(self._SYLLABLES) for _ in range(rng.randint(2, 3)))
+
+    def _sentence(self, rng: random.Random, words: int) -> str:
+        text = " ".join(self._word(rng) for _ in range(words))
+        return text[0].upper() + text[1:] + "."
+
+    def _answer(self, request: dict) -> tuple[str, dict | None]:
+        key = request_key(request)
+        with self._lock:
+            n = self._calls.get(key, 0)
+            self._calls[key] = n + 1
+        seed = hashlib.sha256(f"{key}:{n}".encode()).hexdigest()
+        rng = random.Random(seed)
+
+        # Keep the requested topic so the classifier and topic stats behave as they would live
+        prompt = request["messages"][-1]["content"]
+        focus = _FOCUS.search(prompt)
+        topic = _PAREN.sub("", focus.group(1)).strip() if focus else "Java"
+        name = f"{self._word(rng).capitalize()}{self._word(rng).capitalize()}"
+
+        text = "\n".join([
+            f"## {topic}: the {name} technique ({seed[:6]})",
+            "",
+            "**💡 In a Nutshell**",
+            " ".join(self._sentence(rng, rng.randint(8, 14)) for _ in range(3)),
+            "",
+            "**🔧 Quick Example**",
+            "```java",
+            f"var {name[0].lower() + name[1:]} = new {name}();",
+            *(f"{name[0].lower() + name[1:]}.{self._word(rng)}({rng.randint(1, 99)});" for _ in range(rng.randint(3, 6))),
+            "```",
+            "",
+            "**⚡ Key Takeaway**",
+            *(f"- {self._sentence(rng, rng.randint(6, 10))}" for _ in range(3)),
+            "",
+            f"**🔗 Learn More** — [{topic} docs](https://example.com/{seed[:12]})",
+        ])
+        return text, _estimate_usage(request, text)
+
+
+def create(mode: str, get_client, get_async_client):
+    """Build the backend for LLM_BACKEND mode `mode` (live, record, replay, fake)."""
+    latency = float(os.getenv("LLM_FAKE_LATENCY", "0"))
+    store = ResponseStore(os.getenv("LLM_RECORD_DIR", "llm_recordings"))
+    if mode == "live":
+        return LiveBackend(get_client, get_async_client)
+    if mode == "record":
+        return RecordBackend(LiveBackend(get_client, get_async_client), store)
+    if mode == "replay":
+        strict = os.getenv("LLM_REPLAY_STRICT", "false").lower() in ("1", "true", "yes")
+        return ReplayBackend(store, latency, strict)
+    if mode == "fake":
+        return FakeBackend(latency)
+    raise ValueError(f"Unknown LLM_BACKEND '{mode}' — expected live, record, replay or fake")
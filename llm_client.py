@@ -1,8 +1,22 @@
+from __future__ import annotations
+
 import os
+import time
 import random
+import asyncio
 import logging
-import httpx
-from groq import Groq
+import threading
+import weakref
+from typing import TYPE_CHECKING
+
+import llm_backends
+import metrics
+
+# groq (and the pydantic models it pulls in) and httpx are imported on first use:
+# they dominate import time, and a run served from the buffer never needs them
+if TYPE_CHECKING:
+    import httpx
+    from groq import AsyncGroq, Groq
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +42,9 @@ Constraints:
 - Every sentence must teach something — zero fluff
 """
 
+# Most recent titles fetched for the avoid-list (avoid_list.py decides what fits the prompt)
+MAX_AVOID_TITLES = 30
+
 
 TOPIC_AREAS = [
     # JVM & Core Java
@@ -75,27 +92,167 @@ TOPIC_AREAS = [
 ]
 
 
-def generate_raw_fact(previous_titles: list[str] | None = None) -> str:
-    http_client = httpx.Client(verify=False)
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"), http_client=http_client)
+# ── Shared clients ─────────────────────────────────────────────────────────
+_client: Groq | None = None
+_http_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+# Async clients are bound to the event loop they were created on: one per loop, dropped with it
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple[AsyncGroq, httpx.AsyncClient]] = \
+    weakref.WeakKeyDictionary()
+_stats_lock = threading.Lock()
+_conn_stats = {"requests": 0, "newConnections": 0}
+
+
+def _count_event(event_name: str):
+    # httpcore reports every fresh TCP connect; anything else was served from the keep-alive pool
+    if event_name == "connection.connect_tcp.complete":
+        with _stats_lock:
+            _conn_stats["newConnections"] += 1
+
+
+def _count_request():
+    with _stats_lock:
+        _conn_stats["requests"] += 1
+
+
+def _trace(event_name: str, info: dict):
+    _count_event(event_name)
+
+
+async def _atrace(event_name: str, info: dict):
+    _count_event(event_name)
+
+
+def _on_request(request: httpx.Request):
+    request.extensions["trace"] = _trace
+    _count_request()
+
+
+async def _aon_request(request: httpx.Request):
+    request.extensions["trace"] = _atrace
+    _count_request()
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("GROQ_HTTP2", "false").lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401  (httpx needs it for HTTP/2)
+        return True
+    except ImportError:
+        logger.warning("[LLM] GROQ_HTTP2 is set but the 'h2' package is missing — using HTTP/1.1")
+        return False
+
+
+def _timeout() -> httpx.Timeout:
+    import httpx
+    return httpx.Timeout(
+        float(os.getenv("GROQ_TIMEOUT", "60")),
+        connect=float(os.getenv("GROQ_CONNECT_TIMEOUT", "10")),
+    )
+
+
+def _http_options() -> dict:
+    import httpx
+    max_connections = int(os.getenv("GROQ_MAX_CONNECTIONS", "10"))
+    return dict(
+        verify=False,
+        http2=_http2_enabled(),
+        timeout=_timeout(),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "30")),
+        ),
+    )
+
+
+def _get_client() -> Groq:
+    """Create the process-wide Groq client on first use and reuse it afterwards."""
+    global _client, _http_client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+                from groq import Groq
+                _http_client = httpx.Client(**_http_options(), event_hooks={"request": [_on_request]})
+                # Groq applies its own per-request timeout, so pass ours through as well
+                _client = Groq(api_key=os.getenv("GROQ_API_KEY"), http_client=_http_client, timeout=_timeout())
+    return _client
+
+
+def _get_async_client() -> AsyncGroq:
+    """Async counterpart of _get_client: one client per running event loop."""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        entry = _async_clients.get(loop)
+        if entry is None:
+            import httpx
+            from groq import AsyncGroq
+            http_client = httpx.AsyncClient(**_http_options(), event_hooks={"request": [_aon_request]})
+            entry = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), http_client=http_client, timeout=_timeout()), http_client
+            _async_clients[loop] = entry
+    return entry[0]
+
+
+def warm_up() -> float:
+    """
+    Import the Groq SDK and build the shared client ahead of the first request
+    (nothing to do for the offline backends). Returns the seconds it took.
+    """
+    started = time.perf_counter()
+    if _get_backend().name in ("live", "record"):
+        _get_client()
+    return time.perf_counter() - started
+
+
+def close():
+    """Close pooled connections; the next call lazily opens a fresh client."""
+    global _client, _http_client
+    with _client_lock:
+        if _http_client is not None:
+            _http_client.close()
+            logger.info("[LLM] Client closed — %s", connection_stats())
+        _client, _http_client = None, None
+
+
+async def aclose():
+    """Close the running event loop's async client, if it has one."""
+    with _client_lock:
+        entry = _async_clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[1].aclose()
+        logger.info("[LLM] Async client closed — %s", connection_stats())
+
+
+def connection_stats() -> dict:
+    with _stats_lock:
+        requests, new = _conn_stats["requests"], _conn_stats["newConnections"]
+    return {
+        "requests": requests,
+        "newConnections": new,
+        "reusedConnections": max(requests - new, 0),
+        "reuseRatio": round((requests - new) / requests, 3) if requests else 0.0,
+    }
+
+
+def _build_request(previous_titles: list[str] | None, topic: str | None) -> dict:
     model = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
 
-    # Build a dynamic user prompt with a random topic hint and exclusion list
-    suggested_topic = random.choice(TOPIC_AREAS)
+    # Build a dynamic user prompt with a topic hint (topic_scheduler's pick; random if called directly) and exclusion list
+    suggested_topic = topic or random.choice(TOPIC_AREAS)
     user_prompt = f"Generate a detailed deep-dive article now. Focus on: {suggested_topic}."
 
     if previous_titles:
-        # Include up to 30 most recent titles to avoid
-        titles_to_avoid = previous_titles[:30]
-        avoid_list = "\n".join(f"- {t}" for t in titles_to_avoid)
+        # Already trimmed to the token budget by avoid_list.build
+        avoid_list = "\n".join(f"- {t}" for t in previous_titles)
         user_prompt += (
             f"\n\nIMPORTANT: Do NOT repeat any of these previously covered topics:\n{avoid_list}"
             "\n\nPick a completely different concept that is not in the above list."
         )
 
     logger.info("[LLM] Requesting fact from Groq model=%s, topic_hint='%s'", model, suggested_topic)
-
-    response = client.chat.completions.create(
+    return dict(
         model=model,
         messages=[
             {"role": "system", "content": SYSTEM_PROMPT},
@@ -105,6 +262,43 @@ def generate_raw_fact(previous_titles: list[str] | None = None) -> str:
         temperature=1.0,
     )
 
-    text = response.choices[0].message.content
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _get_backend():
+    """The LLM_BACKEND selected on first use: live (default), record, replay or fake."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                mode = os.getenv("LLM_BACKEND", "live").lower()
+                _backend = llm_backends.create(mode, _get_client, _get_async_client)
+                if mode != "live":
+                    logger.info("[LLM] Using '%s' backend", mode)
+    return _backend
+
+
+def generate_raw_fact(previous_titles: list[str] | None = None, topic: str | None = None) -> str:
+    request = _build_request(previous_titles, topic)
+    backend = _get_backend()
+    with metrics.timer("llm_request_seconds", backend=backend.name):
+        text, usage = backend.complete(request)
+    return _received(text, usage)
+
+
+async def generate_raw_fact_async(previous_titles: list[str] | None = None, topic: str | None = None) -> str:
+    request = _build_request(previous_titles, topic)
+    backend = _get_backend()
+    with metrics.timer("llm_request_seconds", backend=backend.name):
+        text, usage = await backend.acomplete(request)
+    return _received(text, usage)
+
+
+def _received(text: str, usage: dict | None) -> str:
+    if usage is not None:
+        metrics.inc("llm_tokens_total", usage["prompt_tokens"], type="prompt")
+        metrics.inc("llm_tokens_total", usage["completion_tokens"], type="completion")
     logger.info("[LLM] Received fact (%d chars)", len(text))
-    return text
\ No newline at end of file
+    return text
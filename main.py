@@ -1,15 +1,23 @@
 import os
+import asyncio
 import logging
-import threading
 from datetime import datetime
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from apscheduler.schedulers.background import BackgroundScheduler
+from http import HTTPStatus
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from dotenv import load_dotenv
 import json
 
+import avoid_list
 import database
+import dedup_cache
+import email_sender
+import llm_client
+import metrics
+import near_dup
 import pipeline
+import tenants
+import topic_scheduler
 
 # ── Logging ────────────────────────────────────────────────────────────────
 logging.basicConfig(
@@ -19,80 +27,337 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+REQUEST_TIMEOUT = 10  # seconds to receive a full request before dropping the connection
+
+
+# ── Pipeline run queue ─────────────────────────────────────────────────────
+class TriggerQueue:
+    """
+    Bounded queue of pipeline runs drained by a fixed number of workers.
+    A trigger whose key already has a run waiting in the queue joins that run
+    instead of enqueuing another one.
+    """
+
+    def __init__(self, maxsize: int, workers: int):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._pending: dict[str, asyncio.Future] = {}
+        self._workers = workers
+        self._tasks: list[asyncio.Task] = []
+        self.running = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self._workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def submit(self, key: str = "default", job=None) -> tuple[asyncio.Future, bool]:
+        """
+        Queue `job` (a coroutine function; default pipeline.run_async) under `key`.
+        Return (future for the run's result, coalesced?). Raises asyncio.QueueFull.
+        """
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return pending, True
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((key, job or pipeline.run_async, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise
+        self._pending[key] = future
+        return future, False
+
+    async def _worker(self):
+        while True:
+            key, job, future = await self._queue.get()
+            # Once a run has started, new triggers for the key queue a fresh run
+            self._pending.pop(key, None)
+            self.running += 1
+            try:
+                future.set_result(await job())
+            except Exception as e:
+                logger.error("[Scheduler] Pipeline failed: %s", e, exc_info=True)
+                future.set_result(False)
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "running": self.running,
+            "workers": self._workers,
+            "alive": sum(not task.done() for task in self._tasks),
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+
+# ── Cached health model ───────────────────────────────────────────────────
+class HealthCache:
+    """
+    Health state served from memory. The sent_facts count (a full COUNT(*)) is
+    recounted on a worker thread at most every `ttl` seconds, never while a
+    request waits; inserts made by this process keep it current in between.
+    A successful recount also marks the database as reachable for /readyz.
+    A failed one counts as an attempt too, so probes can't hammer a DB that is down.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.db_ok: bool | None = None   # None until the first recount finishes
+        self._refresh: asyncio.Task | None = None
+        self._attempted_at: float | None = None   # loop time the last recount started, successful or not
+
+    def total_facts(self) -> tuple[int | None, float | None]:
+        """(cached count, age in seconds); schedules a background recount once the last attempt is stale."""
+        count, age = database.cached_fact_count()
+        if self._attempted_at is None or asyncio.get_running_loop().time() - self._attempted_at > self.ttl:
+            self.refresh()
+        return count, age
+
+    def refresh(self):
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._recount())
+
+    async def _recount(self):
+        self._attempted_at = asyncio.get_running_loop().time()
+        try:
+            await asyncio.to_thread(database.refresh_fact_count)
+            self.db_ok = True
+        except Exception as e:
+            self.db_ok = False
+            logger.warning("[Health] Fact recount failed: %s", e)
+
+    async def stop(self):
+        if self._refresh is not None:
+            self._refresh.cancel()
+            await asyncio.gather(self._refresh, return_exceptions=True)
+
 
 # ── HTTP health + manual trigger server ───────────────────────────────────
-class Handler(BaseHTTPRequestHandler):
-    def log_message(self, format, *args):
-        pass  # Suppress default noisy HTTP logs
+class Handler:
+    """Serves one HTTP/1.1 request per connection on the asyncio server."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, queue: TriggerQueue,
+                 health: HealthCache):
+        self.reader = reader
+        self.writer = writer
+        self.queue = queue
+        self.health = health
+        self.command = ""
+        self.path = ""
+
+    async def handle(self):
+        try:
+            await asyncio.wait_for(self._read_request(), REQUEST_TIMEOUT)
+            if self.command == "GET":
+                await self.do_GET()
+            elif self.command == "POST":
+                await self.do_POST()
+            else:
+                await self._respond(405, b'{"error": "method not allowed"}')
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, ConnectionError):
+            pass
+        finally:
+            self.writer.close()
+
+    async def _read_request(self):
+        request_line = (await self.reader.readline()).decode("latin-1").split()
+        if len(request_line) < 2:
+            raise ValueError("malformed request line")
+        self.command, self.path = request_line[0].upper(), request_line[1]
+        content_length = 0
+        while True:
+            line = (await self.reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                content_length = int(value.strip())
+        if content_length:
+            await self.reader.readexactly(content_length)   # body is ignored
 
-    def do_GET(self):
-        if self.path == "/health":
+    async def do_GET(self):
+        if self.path == "/livez":
+            # The event loop answered; nothing else is checked
+            await self._respond(200, b'{"status": "UP"}')
+        elif self.path == "/readyz":
+            self.health.total_facts()   # keeps the database check fresh
+            checks = {
+                "database": self.health.db_ok is True,
+                "dedupCache": dedup_cache.stats()["loaded"],
+                "pipelineWorkers": self.queue.stats()["alive"] > 0,
+            }
+            ready = all(checks.values())
+            body = json.dumps({"status": "READY" if ready else "NOT_READY", "checks": checks}).encode()
+            await self._respond(200 if ready else 503, body)
+        elif self.path == "/health":
+            total, age = self.health.total_facts()
             body = json.dumps({
                 "status": "UP",
                 "timestamp": datetime.now().isoformat(),
-                "totalFactsSent": database.total_facts(),
+                "totalFactsSent": total,
+                "totalFactsAgeSeconds": round(age, 1) if age is not None else None,
+                "dbPool": database.pool_stats(),
+                "dedupCache": dedup_cache.stats(),
+                "llmClient": llm_client.connection_stats(),
+                "triggerQueue": self.queue.stats(),
             }).encode()
-            self._respond(200, body)
+            await self._respond(200, body)
+        elif self.path == "/metrics":
+            # Gauges call into the stats() functions, which only take in-process locks
+            await self._respond(200, metrics.render().encode(), "text/plain; version=0.0.4; charset=utf-8")
         else:
-            self._respond(404, b'{"error": "not found"}')
+            await self._respond(404, b'{"error": "not found"}')
 
-    def do_POST(self):
+    async def do_POST(self):
         if self.path == "/trigger":
             logger.info("[API] Manual trigger received")
-            # Run pipeline in background so HTTP response is immediate
-            t = threading.Thread(target=_safe_run, daemon=True)
-            t.start()
-            body = json.dumps({"triggered": True, "timestamp": datetime.now().isoformat()}).encode()
-            self._respond(200, body)
+            # Queue the run so the HTTP response is immediate
+            try:
+                _, coalesced = self.queue.submit()
+            except asyncio.QueueFull:
+                await self._respond(429, b'{"error": "too many pending runs"}')
+                return
+            body = json.dumps({
+                "triggered": True,
+                "coalesced": coalesced,
+                "timestamp": datetime.now().isoformat(),
+            }).encode()
+            await self._respond(200, body)
         else:
-            self._respond(404, b'{"error": "not found"}')
+            await self._respond(404, b'{"error": "not found"}')
 
-    def _respond(self, code, body):
-        self.send_response(code)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
-
-
-def _safe_run():
-    try:
-        pipeline.run()
-    except Exception as e:
-        logger.error("[Scheduler] Pipeline failed: %s", e, exc_info=True)
+    async def _respond(self, code, body, content_type="application/json"):
+        head = (
+            f"HTTP/1.1 {code} {HTTPStatus(code).phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode()
+        self.writer.write(head + body)
+        await self.writer.drain()
 
 
 # ── Entry point ────────────────────────────────────────────────────────────
-def main():
-    load_dotenv()
+async def _serve():
+    queue = TriggerQueue(
+        maxsize=int(os.getenv("TRIGGER_QUEUE_SIZE", "4")),
+        workers=int(os.getenv("PIPELINE_WORKERS", "1")),
+    )
+    queue.start()
+    health = HealthCache(ttl=float(os.getenv("HEALTH_CACHE_TTL", "60")))
+    health.refresh()
 
-    # Init DB
-    database.init_db()
+    # Gauges for /metrics, read only when scraped
+    metrics.register("db_pool", database.pool_stats)
+    metrics.register("dedup_cache", dedup_cache.stats)
+    metrics.register("llm_client", llm_client.connection_stats)
+    metrics.register("trigger_queue", queue.stats)
+    metrics.register("topic_scheduler", topic_scheduler.stats)
+
+    # Scheduler — 9:00 AM IST = 03:30 UTC; shares the event loop and the run queue
+    async def scheduled_run():
+        try:
+            queue.submit()
+        except asyncio.QueueFull:
+            logger.error("[Scheduler] Run queue full — skipping scheduled run")
 
-    # Scheduler — 9:00 AM IST = 03:30 UTC
-    scheduler = BackgroundScheduler(timezone="UTC")
+    scheduler = AsyncIOScheduler(timezone="UTC")
     scheduler.add_job(
-        _safe_run,
+        scheduled_run,
         trigger=CronTrigger(hour=3, minute=30),
         id="daily_fact",
         name="Daily Java Fact",
         replace_existing=True,
     )
+
+    # Tenants: one job per distinct crontab schedule, fanning out to every tenant on it
+    def tenant_run(schedule: str):
+        async def job():
+            results = await asyncio.to_thread(pipeline.run_tenants, await asyncio.to_thread(tenants.load, schedule))
+            return all(results.values())
+
+        async def enqueue():
+            try:
+                queue.submit(f"tenants:{schedule}", job)
+            except asyncio.QueueFull:
+                logger.error("[Scheduler] Run queue full — skipping tenant run for '%s'", schedule)
+        return enqueue
+
+    for schedule in await asyncio.to_thread(tenants.schedules):
+        scheduler.add_job(
+            tenant_run(schedule),
+            trigger=CronTrigger.from_crontab(schedule, timezone="UTC"),
+            id=f"tenants:{schedule}",
+            name=f"Tenant facts ({schedule})",
+            replace_existing=True,
+        )
+        logger.info("[Scheduler] Tenant fan-out scheduled at '%s' UTC", schedule)
+
+    # Buffer refill runs off-peak so the 03:30 delivery only has to pop and send
+    async def refill_buffer():
+        try:
+            await asyncio.to_thread(pipeline.refill_buffer)
+        except Exception as e:
+            logger.error("[Scheduler] Buffer refill failed: %s", e, exc_info=True)
+
+    refill_cron = os.getenv("BUFFER_REFILL_CRON", "0 12 * * *")
+    scheduler.add_job(
+        refill_buffer,
+        trigger=CronTrigger.from_crontab(refill_cron, timezone="UTC"),
+        id="refill_buffer",
+        name="Refill fact buffer",
+        replace_existing=True,
+    )
     scheduler.start()
-    logger.info("[Scheduler] Scheduled daily at 9:00 AM IST (03:30 UTC)")
+    logger.info("[Scheduler] Scheduled daily at 9:00 AM IST (03:30 UTC); buffer refill at '%s' UTC", refill_cron)
 
     # HTTP server
     port = int(os.getenv("PORT", 8080))
-    server = HTTPServer(("0.0.0.0", port), Handler)
+    server = await asyncio.start_server(
+        lambda r, w: Handler(r, w, queue, health).handle(), "0.0.0.0", port
+    )
     logger.info("[Server] Listening on http://localhost:%d", port)
     logger.info("[Server] POST /trigger to send a fact NOW")
-    logger.info("[Server] GET  /health  to check status")
+    logger.info("[Server] GET  /health  to check status (GET /livez, /readyz for probes)")
+    logger.info("[Server] GET  /metrics for Prometheus")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        scheduler.shutdown(wait=False)
+        await health.stop()
+        await queue.stop()
+        await llm_client.aclose()
+
+
+def main():
+    load_dotenv()
+
+    # Init DB
+    database.init_db()
+    dedup_cache.load()
+    near_dup.load()
+    avoid_list.load()
+    topic_scheduler.load()
 
     try:
-        server.serve_forever()
+        asyncio.run(_serve())
     except KeyboardInterrupt:
         logger.info("Shutting down...")
-        scheduler.shutdown()
+    finally:
+        llm_client.close()
+        email_sender.close()
+        database.close_pool()
 
 
 if __name__ == "__main__":
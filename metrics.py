@@ -0,0 +1,155 @@
+"""
+Process-wide metrics, exposed in Prometheus text format on GET /metrics.
+
+Counters and fixed-bucket histograms are recorded in place (a dict update
+under a lock). Gauges are not recorded at all: modules register a stats()
+function and it is only called when /metrics is scraped, so pool and cache
+sizes cost nothing between scrapes.
+"""
+import re
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+PREFIX = "javafact_"
+
+# Seconds; wide enough for a cache hit and a slow LLM call alike
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HELP = {
+    "pipeline_runs_total": "Pipeline runs by outcome (delivered, skipped, failed)",
+    "pipeline_run_seconds": "End-to-end duration of a pipeline run",
+    "pipeline_stage_seconds": "Time spent in each pipeline stage",
+    "pipeline_duplicates_total": "Candidates rejected by dedup, by kind (exact, near)",
+    "pipeline_dedup_retries_total": "Extra LLM calls made because a candidate was a duplicate",
+    "pipeline_jobs_resumed_total": "Abandoned jobs picked up again by a later run",
+    "pipeline_buffer_hits_total": "Runs served from the pre-generated buffer",
+    "llm_request_seconds": "Groq chat completion latency, by outcome",
+    "llm_tokens_total": "Tokens reported in Groq usage, by type (prompt, completion)",
+    "email_send_seconds": "Time to deliver one fact to all its recipients",
+    "email_smtp_connect_seconds": "SMTP connect + STARTTLS + login handshake",
+    "email_recipients_total": "Recipients by delivery outcome",
+}
+
+_lock = threading.Lock()
+_counters: dict[str, dict[tuple, float]] = {}
+_histograms: dict[str, dict[tuple, list]] = {}   # labels → [bucket counts..., sum, count]
+_collectors: dict[str, Callable[[], dict]] = {}
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def inc(name: str, amount: float = 1, **labels):
+    key = _labels(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + amount
+
+
+def observe(name: str, value: float, **labels):
+    key = _labels(labels)
+    slot = bisect.bisect_left(DEFAULT_BUCKETS, value)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = [0] * (len(DEFAULT_BUCKETS) + 2)
+        if slot < len(DEFAULT_BUCKETS):
+            hist[slot] += 1
+        hist[-2] += value
+        hist[-1] += 1
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """Observe the block's duration in seconds, labelled outcome="ok" or "error"."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        observe(name, time.perf_counter() - started, outcome=outcome, **labels)
+
+
+def register(prefix: str, collect: Callable[[], dict]):
+    """Export every number in collect()'s dict as a gauge named <prefix>_<key>, read at scrape time."""
+    _collectors[prefix] = collect
+
+
+def unregister(prefix: str):
+    _collectors.pop(prefix, None)
+
+
+_CAMEL = re.compile(r"(?<!^)(?=[A-Z])")
+
+
+def _snake(key: str) -> str:
+    return _CAMEL.sub("_", key).lower()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render() -> str:
+    """Everything recorded so far plus the registered gauges, in Prometheus text exposition format."""
+    with _lock:
+        counters = {name: dict(series) for name, series in _counters.items()}
+        histograms = {name: {k: list(v) for k, v in series.items()} for name, series in _histograms.items()}
+    lines = []
+
+    for name, series in sorted(counters.items()):
+        full = PREFIX + name
+        if name in HELP:
+            lines.append(f"# HELP {full} {HELP[name]}")
+        lines.append(f"# TYPE {full} counter")
+        for key, value in sorted(series.items()):
+            lines.append(f"{full}{_format_labels(key)} {_number(value)}")
+
+    for name, series in sorted(histograms.items()):
+        full = PREFIX + name
+        if name in HELP:
+            lines.append(f"# HELP {full} {HELP[name]}")
+        lines.append(f"# TYPE {full} histogram")
+        for key, hist in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(DEFAULT_BUCKETS, hist):
+                cumulative += count
+                lines.append(f"{full}_bucket{_format_labels(key, (('le', _number(float(bound))),))} {cumulative}")
+            lines.append(f"{full}_bucket{_format_labels(key, (('le', '+Inf'),))} {hist[-1]}")
+            lines.append(f"{full}_sum{_format_labels(key)} {_number(round(hist[-2], 6))}")
+            lines.append(f"{full}_count{_format_labels(key)} {hist[-1]}")
+
+    for prefix, collect in sorted(_collectors.items()):
+        try:
+            stats = collect()
+        except Exception:
+            continue   # a broken collector must not take the whole scrape down
+        for key, value in stats.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            full = f"{PREFIX}{prefix}_{_snake(key)}"
+            lines.append(f"# TYPE {full} gauge")
+            lines.append(f"{full} {_number(value)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,129 @@
+"""
+Near-duplicate detection for reworded facts.
+
+Each fact gets a 64-bit SimHash over word shingles of its text (no network
+model needed). Fingerprints are stored in sent_facts.simhash and kept in an
+in-memory LSH index: the 64 bits are cut into max_distance + 1 bands, so any
+fingerprint within max_distance bits of a query shares at least one band
+exactly (pigeonhole) and a lookup is a few dict probes plus popcounts.
+
+Config (env): NEAR_DUP_MAX_DISTANCE, NEAR_DUP_SHINGLE.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+
+import database
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+_MASK64 = (1 << 64) - 1
+
+
+def fingerprint(text: str, shingle: int | None = None) -> int:
+    """64-bit SimHash of the text's word shingles."""
+    if shingle is None:
+        shingle = int(os.getenv("NEAR_DUP_SHINGLE", "1"))
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < shingle:
+        shingles = [" ".join(tokens)]
+    else:
+        shingles = [" ".join(tokens[i:i + shingle]) for i in range(len(tokens) - shingle + 1)]
+
+    weights = [0] * 64
+    for s in shingles:
+        h = int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, w in enumerate(weights) if w > 0)
+
+
+def to_signed(fp: int) -> int:
+    """Postgres BIGINT is signed; store the unsigned fingerprint's two's complement."""
+    return fp - (1 << 64) if fp >= 1 << 63 else fp
+
+
+def to_unsigned(value: int) -> int:
+    return value & _MASK64
+
+
+class SimHashIndex:
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width, extra = divmod(64, bands)
+        self._bands = []   # (shift, mask) per band
+        shift = 0
+        for i in range(bands):
+            w = width + (1 if i < extra else 0)
+            self._bands.append((shift, (1 << w) - 1))
+            shift += w
+        self._tables: list[dict[int, list[int]]] = [{} for _ in self._bands]
+        self.size = 0
+
+    def add(self, fp: int):
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table.setdefault(fp >> shift & mask, []).append(fp)
+        self.size += 1
+
+    def nearest(self, fp: int) -> tuple[int, int] | None:
+        """Return (fingerprint, distance) of the closest entry within max_distance, if any."""
+        best = None
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            for other in table.get(fp >> shift & mask, ()):
+                distance = (fp ^ other).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (other, distance)
+        return best
+
+
+_lock = threading.Lock()
+_indexes: dict[int, SimHashIndex] | None = None   # one index per tenant (0 = default audience)
+_max_distance = 6
+
+
+def load():
+    """Build the indexes from sent_facts, backfilling fingerprints for rows saved before they existed."""
+    global _indexes, _max_distance
+    started = time.monotonic()
+    max_distance = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "6"))
+    indexes: dict[int, SimHashIndex] = {}
+
+    backfill = []
+    for tenant_key, row_id, simhash, content in database.iter_simhashes():
+        if simhash is None:
+            fp = fingerprint(content)
+            backfill.append((to_signed(fp), row_id))
+        else:
+            fp = to_unsigned(simhash)
+        if tenant_key not in indexes:
+            indexes[tenant_key] = SimHashIndex(max_distance)
+        indexes[tenant_key].add(fp)
+    if backfill:
+        database.set_simhashes(backfill)
+
+    with _lock:
+        _indexes, _max_distance = indexes, max_distance
+    logger.info("[NearDup] Indexed %d fingerprints across %d audience(s) (%d backfilled) in %.2fs, max_distance=%d",
+                sum(i.size for i in indexes.values()), len(indexes), len(backfill),
+                time.monotonic() - started, max_distance)
+
+
+def find_similar(fp: int, tenant_id: int | None = None) -> tuple[int, int] | None:
+    with _lock:
+        if _indexes is None:
+            return None
+        index = _indexes.get(tenant_id or 0)
+        return index.nearest(fp) if index is not None else None
+
+
+def add(fp: int, tenant_id: int | None = None):
+    with _lock:
+        if _indexes is not None:
+            if (tenant_id or 0) not in _indexes:
+                _indexes[tenant_id or 0] = SimHashIndex(_max_distance)
+            _indexes[tenant_id or 0].add(fp)
@@ -1,56 +1,492 @@
+import os
+import asyncio
+import functools
 import logging
+import threading
 import time
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import avoid_list
 import database
+import dedup_cache
 import fact_generator
+import jobs
+import llm_client
+import metrics
+import near_dup
+import topic_scheduler
 import email_sender
 
 logger = logging.getLogger(__name__)
 
 MAX_DEDUP_RETRIES = 5
 
+_refill_lock = threading.Lock()
+# Index loads still running in the background (cold start); dedup checks wait for them
+_dedup_loads: list = []
 
+
+def _record_run(started: float, outcome: str):
+    metrics.observe("pipeline_run_seconds", time.perf_counter() - started)
+    metrics.inc("pipeline_runs_total", outcome=outcome)
+
+
+def _instrumented(fn):
+    """
+    Record the duration and outcome (delivered / skipped / failed) of run() and
+    run_async(), and store the topic duplicate rates the run learned.
+    """
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper():
+            started = time.perf_counter()
+            try:
+                ok = await fn()
+            except Exception:
+                _record_run(started, "failed")
+                raise
+            finally:
+                await asyncio.to_thread(topic_scheduler.flush)
+            _record_run(started, "delivered" if ok else "skipped")
+            return ok
+        return wrapper
+
+    @functools.wraps(fn)
+    def wrapper():
+        started = time.perf_counter()
+        try:
+            ok = fn()
+        except Exception:
+            _record_run(started, "failed")
+            raise
+        finally:
+            topic_scheduler.flush()
+        _record_run(started, "delivered" if ok else "skipped")
+        return ok
+    return wrapper
+
+
+@_instrumented
 def run() -> bool:
     """
-    Full pipeline: Generate → Deduplicate → Persist → Email.
+    Full pipeline: Generate → Deduplicate → Persist → Email, tracked as a durable job.
+    A run first resumes an abandoned job (crash or failed delivery) from the
+    stage it reached; otherwise a pre-generated fact from the buffer, when
+    available, replaces the first three steps.
     Returns True on success, False if skipped (all duplicates).
     """
     logger.info("[Pipeline] Starting daily fact pipeline")
 
-    # Fetch previously sent titles to guide the LLM away from repeats
-    previous_titles = database.get_previous_titles()
-    logger.info("[Pipeline] %d previous facts in database", len(previous_titles))
+    job = _resume_or_take_buffered()
+    if job is None:
+        # Fetch the most recent titles to guide the LLM away from repeats
+        previous_titles = database.get_recent_titles(llm_client.MAX_AVOID_TITLES)
+        logger.info("[Pipeline] %d recent titles loaded for the avoid-list", len(previous_titles))
+
+        # Step 1: Generate with deduplication retries
+        fanout, budget = _generation_limits()
+        with metrics.timer("pipeline_stage_seconds", stage="generate"):
+            if fanout > 1:
+                fact = _generate_speculative(previous_titles, fanout, budget)
+            else:
+                fact = _generate_serial(previous_titles, budget)
+
+        if fact is None:
+            logger.error("[Pipeline] All %d attempts produced duplicates. Skipping today.", budget)
+            return False
+
+        job = _start_job(fact)
+        if job is None:
+            return False
+
+    # Steps 2 + 3: Persist, then send email (retry once on failure)
+    with _job_attempt(job):
+        if job.stage == "generated" and not _persist(job):
+            return False
+        _deliver(job, email_sender.recipients_from_env())
+
+    logger.info("[Pipeline] Done. Fact '%s' delivered.", job.fact.title)
+    return True
+
+
+@_instrumented
+async def run_async() -> bool:
+    """
+    asyncio version of run(): LLM calls use the async Groq client (speculative
+    candidates are genuinely cancelled), while the blocking psycopg2 and SMTP
+    steps run on the default executor so the event loop stays responsive.
+    """
+    logger.info("[Pipeline] Starting daily fact pipeline (async)")
+
+    job = await asyncio.to_thread(_resume_or_take_buffered)
+    if job is None:
+        previous_titles = await asyncio.to_thread(database.get_recent_titles, llm_client.MAX_AVOID_TITLES)
+        logger.info("[Pipeline] %d recent titles loaded for the avoid-list", len(previous_titles))
+
+        fanout, budget = _generation_limits()
+        with metrics.timer("pipeline_stage_seconds", stage="generate"):
+            fact = await _generate_async(previous_titles, fanout, budget)
+        if fact is None:
+            logger.error("[Pipeline] All %d attempts produced duplicates. Skipping today.", budget)
+            return False
+
+        job = await asyncio.to_thread(_start_job, fact)
+        if job is None:
+            return False
+
+    with _job_attempt(job):
+        if job.stage == "generated" and not await asyncio.to_thread(_persist, job):
+            return False
+        await asyncio.to_thread(_deliver, job, email_sender.recipients_from_env())
+
+    logger.info("[Pipeline] Done. Fact '%s' delivered.", job.fact.title)
+    return True
+
+
+def refill_buffer() -> int:
+    """
+    Top pending_facts up to FACT_BUFFER_SIZE deduplicated facts, one LLM call at
+    a time. Stops as soon as the buffer is full or BUFFER_REFILL_MAX_CALLS calls
+    have been spent; a refill already in progress makes this a no-op.
+    Returns the number of facts added.
+    """
+    target = int(os.getenv("FACT_BUFFER_SIZE", "3"))
+    if target <= 0 or not _refill_lock.acquire(blocking=False):
+        return 0
+    try:
+        max_calls = int(os.getenv("BUFFER_REFILL_MAX_CALLS", str(target * 2)))
+        added = calls = 0
+        while calls < max_calls and database.buffered_count() < target:
+            previous_titles = database.get_recent_titles(llm_client.MAX_AVOID_TITLES)
+            candidate = fact_generator.generate(previous_titles=previous_titles)
+            calls += 1
+            if _is_duplicate(candidate):
+                logger.warning("[Pipeline] Buffer refill produced a duplicate (title='%s')", candidate.title)
+                continue
+            _buffer(candidate)
+            added += 1
+        logger.info("[Pipeline] Buffer refill: +%d fact(s) using %d LLM call(s)", added, calls)
+        return added
+    finally:
+        _refill_lock.release()
+        topic_scheduler.flush()
+
+
+def run_tenants(tenant_list) -> dict[int, bool]:
+    """
+    Fan one run out across many tenants (see tenants.py) on a bounded thread pool.
+    Tenants with an abandoned job resume it first. For the rest, each round
+    groups the still-unserved tenants by a shared topic hint so one LLM call
+    serves every tenant in the group; a candidate is accepted per tenant
+    against that tenant's own history. Each served tenant then gets a single
+    bulk send to all its subscribers. Returns {tenant_id: delivered?} for
+    every tenant that has subscribers.
+    """
+    _, budget = _generation_limits()
+    workers = max(1, int(os.getenv("TENANT_WORKERS", "8")))
+    unserved = {t.id: t for t in tenant_list if t.recipients}
+    tried: dict[int, set[str]] = {t: set() for t in unserved}
+    tenant_jobs = jobs.resume(list(unserved))
+    metrics.inc("pipeline_jobs_resumed_total", len(tenant_jobs))
+    for job in tenant_jobs.values():
+        logger.info("[Pipeline] Tenant %d: resuming job %d at stage '%s'", job.tenant_id, job.id, job.stage)
+        del unserved[job.tenant_id]
+    logger.info("[Pipeline] Fan-out to %d tenant(s) on %d worker(s)", len(unserved) + len(tenant_jobs), workers)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tenant") as pool:
+        for round_no in range(1, budget + 1):
+            if not unserved:
+                break
+            groups = _group_by_topic(list(unserved.values()), tried)
+            logger.info("[Pipeline] Round %d: %d LLM call(s) for %d tenant(s)", round_no, len(groups), len(unserved))
+            futures = {pool.submit(_generate_for_tenants, topic, members): (topic, members)
+                       for topic, members in groups.items()}
+            for future in as_completed(futures):
+                topic, members = futures[future]
+                try:
+                    candidate = future.result()
+                except Exception as e:
+                    logger.warning("[Pipeline] Generation for topic '%s' failed: %s", topic, e)
+                    continue
+                for tenant in members:
+                    tried[tenant.id].add(topic)
+                    if _is_duplicate(candidate, tenant.id):
+                        continue
+                    job = _start_job(candidate, tenant.id)
+                    if job is not None:
+                        tenant_jobs[tenant.id] = job
+                        del unserved[tenant.id]
+
+        topic_scheduler.flush()
+        for tenant in unserved.values():
+            logger.error("[Pipeline] Tenant '%s': all attempts produced duplicates. Skipping.", tenant.name)
+
+        served = [t for t in tenant_list if t.id in tenant_jobs]
+        outcomes = pool.map(lambda t: _complete_tenant_job(t, tenant_jobs[t.id]), served)
+        results = {t.id: ok for t, ok in zip(served, outcomes)}
+    results.update({tenant_id: False for tenant_id in unserved})
+    return results
+
+
+def _group_by_topic(tenant_list, tried: dict[int, set[str]]) -> dict[str, list]:
+    """
+    Greedily pick the topic hint shared by the most tenants until every tenant
+    has one; ties go to topic_scheduler's weighted pick for those tenants.
+    """
+    remaining = list(tenant_list)
+    groups = {}
+    while remaining:
+        options = {t.id: (t.topic_set() - tried[t.id]) or t.topic_set() for t in remaining}
+        counts = Counter(topic for topics in options.values() for topic in topics)
+        best = max(counts.values())
+        ties = sorted(tp for tp, n in counts.items() if n == best)
+        topic = topic_scheduler.pick(1, tenant_ids=[t.id for t in remaining], candidates=ties)[0]
+        groups[topic] = [t for t in remaining if topic in options[t.id]]
+        remaining = [t for t in remaining if topic not in options[t.id]]
+    return groups
+
+
+def _generate_for_tenants(topic: str, members):
+    previous_titles = database.get_recent_titles_for_tenants(
+        [m.id for m in members], per_tenant=max(1, llm_client.MAX_AVOID_TITLES // len(members)),
+    )
+    return fact_generator.generate(previous_titles=previous_titles, topic=topic,
+                                   tenant_ids=[m.id for m in members])
+
+
+def _complete_tenant_job(tenant, job) -> bool:
+    try:
+        with _job_attempt(job):
+            if job.stage == "generated" and not _persist(job):
+                return False
+            _deliver(job, tenant.recipients, subject_prefix=tenant.subject_prefix, schedule=tenant.schedule)
+        logger.info("[Pipeline] Tenant '%s': delivered '%s'", tenant.name, job.fact.title)
+        return True
+    except Exception as e:
+        logger.error("[Pipeline] Tenant '%s': delivery failed: %s", tenant.name, e)
+        return False
+
+
+def _generation_limits() -> tuple[int, int]:
+    fanout = max(1, int(os.getenv("PIPELINE_SPECULATIVE", "1")))
+    budget = max(1, int(os.getenv("PIPELINE_MAX_LLM_CALLS", str(MAX_DEDUP_RETRIES))))
+    return fanout, budget
 
-    # Step 1: Generate with deduplication retries
-    fact = None
-    for attempt in range(1, MAX_DEDUP_RETRIES + 1):
-        logger.info("[Pipeline] Generation attempt %d/%d", attempt, MAX_DEDUP_RETRIES)
-        candidate = fact_generator.generate(previous_titles=previous_titles)
 
-        if database.title_exists(candidate.title) or database.hash_exists(candidate.content_hash):
+def _generate_serial(previous_titles, budget):
+    used_topics: set[str] = set()
+    for attempt in range(1, budget + 1):
+        logger.info("[Pipeline] Generation attempt %d/%d", attempt, budget)
+        if attempt > 1:
+            metrics.inc("pipeline_dedup_retries_total")
+        topic = topic_scheduler.pick(1, exclude=used_topics)[0]
+        used_topics.add(topic)
+        candidate = fact_generator.generate(previous_titles=previous_titles, topic=topic)
+
+        if _is_duplicate(candidate):
             logger.warning("[Pipeline] Duplicate on attempt %d (title='%s') — retrying...", attempt, candidate.title)
             continue
 
-        fact = candidate
-        break
+        return candidate
+    return None
 
-    if fact is None:
-        logger.error("[Pipeline] All %d attempts produced duplicates. Skipping today.", MAX_DEDUP_RETRIES)
-        return False
 
-    # Step 2: Persist
-    database.save_fact(fact.title, fact.content, fact.content_hash, fact.topic_category)
+def _generate_speculative(previous_titles, fanout, budget):
+    """
+    Request up to `fanout` candidates at once, each with a different topic hint,
+    and keep the first one that passes dedup. Runs _generate_async on a private
+    event loop, so the calls still in flight are cancelled as soon as a
+    candidate is accepted instead of finishing on worker threads.
+    Never issues more than `budget` LLM calls in total.
+    """
+    async def generate():
+        try:
+            return await _generate_async(previous_titles, fanout, budget)
+        finally:
+            await llm_client.aclose()   # its connections belong to this loop
 
-    # Step 3: Send email (retry once on failure)
-    _send_with_retry(fact)
+    return asyncio.run(generate())
 
-    logger.info("[Pipeline] Done. Fact '%s' delivered.", fact.title)
-    return True
 
+async def _generate_async(previous_titles, fanout, budget):
+    calls = 0
+    received = 0
+    used_topics: set[str] = set()
+    last_error = None
 
-def _send_with_retry(fact):
+    while calls < budget:
+        topics = topic_scheduler.pick(min(fanout, budget - calls), exclude=used_topics)
+        used_topics.update(topics)
+        if calls:
+            metrics.inc("pipeline_dedup_retries_total", len(topics))
+        calls += len(topics)
+        logger.info("[Pipeline] Generation round: %d candidate(s) (%d/%d calls)", len(topics), calls, budget)
+
+        tasks = [asyncio.create_task(fact_generator.generate_async(previous_titles, topic)) for topic in topics]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    candidate = await next_done
+                except Exception as e:
+                    last_error = e
+                    logger.warning("[Pipeline] Candidate failed: %s", e)
+                    continue
+                received += 1
+                if await asyncio.to_thread(_is_duplicate, candidate):
+                    logger.warning("[Pipeline] Duplicate (title='%s') — retrying...", candidate.title)
+                    continue
+                return candidate
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    if received == 0 and last_error is not None:
+        raise last_error
+    return None
+
+
+def _start_job(fact, tenant_id: int | None = None):
+    job = jobs.start(fact, tenant_id)
+    if job is None:
+        logger.warning("[Pipeline] '%s' is already being delivered by another run", fact.title)
+    return job
+
+
+def _resume_or_take_buffered():
+    job = jobs.resume([None]).get(None)
+    if job is not None:
+        logger.info("[Pipeline] Resuming job %d ('%s') at stage '%s'", job.id, job.fact.title, job.stage)
+        metrics.inc("pipeline_jobs_resumed_total")
+        return job
+    job = jobs.take_buffered()
+    if job is not None:
+        logger.info("[Pipeline] Using pre-generated fact '%s'", job.fact.title)
+        metrics.inc("pipeline_buffer_hits_total")
+    return job
+
+
+@contextmanager
+def _job_attempt(job):
+    """Hand the job back (or mark it failed once out of attempts) if the block raises."""
     try:
-        email_sender.send(fact)
+        yield
     except Exception as e:
-        logger.warning("[Pipeline] Email failed: %s — retrying in 10s...", e)
+        stage = jobs.release(job, e)
+        logger.error("[Pipeline] Job %d left at stage '%s' (attempt %d): %s", job.id, stage, job.attempts, e)
+        raise
+
+
+def _persist(job) -> bool:
+    """Store the job's fact; False when sent_facts already had it, and the job must not be delivered."""
+    with metrics.timer("pipeline_stage_seconds", stage="persist"):
+        persisted = jobs.persist(job)
+    _await_dedup_loads()
+    fact = job.fact
+    # Either way the fact is in sent_facts now, so the dedup indexes should know it
+    dedup_cache.add(fact.title, fact.content_hash, job.tenant_id)
+    near_dup.add(fact.simhash, job.tenant_id)
+    if not persisted:
+        logger.warning("[Pipeline] '%s' was already in sent_facts; job %d closed without delivery",
+                       fact.title, job.id)
+        return False
+    avoid_list.add(fact.title, fact.topic_category, job.tenant_id)
+    topic_scheduler.add(fact.topic_hint, fact.topic_category, job.tenant_id)
+    return True
+
+
+def _buffer(fact):
+    database.buffer_fact(fact.title, fact.content, fact.content_hash, fact.topic_category,
+                         near_dup.to_signed(fact.simhash), fact.topic_hint)
+    _await_dedup_loads()
+    # Buffered facts count as taken for every later dedup check
+    dedup_cache.add(fact.title, fact.content_hash)
+    near_dup.add(fact.simhash)
+    avoid_list.add(fact.title, fact.topic_category)
+    topic_scheduler.add(fact.topic_hint, fact.topic_category)
+
+
+def defer_dedup_until(futures):
+    """
+    Let a run start while the dedup indexes (dedup_cache, near_dup) are still
+    loading on `futures`: generation goes ahead, and the first dedup check
+    waits for the loads and re-raises if one of them failed.
+    """
+    _dedup_loads[:] = futures
+
+
+def _await_dedup_loads():
+    # Also before adding to the indexes: a load still running would drop the addition
+    for future in _dedup_loads:
+        future.result()
+
+
+def _is_duplicate(candidate, tenant_id: int | None = None) -> bool:
+    _await_dedup_loads()
+    with metrics.timer("pipeline_stage_seconds", stage="dedup"):
+        kind = _duplicate_kind(candidate, tenant_id)
+    if kind is not None:
+        metrics.inc("pipeline_duplicates_total", kind=kind)
+    # Teach the scheduler which topics are saturated for this audience
+    topic_scheduler.observe(candidate.topic_hint, kind is not None, tenant_id)
+    return kind is not None
+
+
+def _duplicate_kind(candidate, tenant_id: int | None) -> str | None:
+    # The in-process cache catches known duplicates; anything it has not seen is confirmed by the DB
+    cached = dedup_cache.check(candidate.title, candidate.content_hash, tenant_id)
+    if cached is None:
+        cached = database.is_duplicate(candidate.title, candidate.content_hash, tenant_id)
+    if cached:
+        return "exact"
+
+    similar = near_dup.find_similar(candidate.simhash, tenant_id)
+    if similar is not None:
+        logger.warning("[Pipeline] Near-duplicate of an earlier fact (%d bits apart): '%s'",
+                       similar[1], candidate.title)
+        return "near"
+    return None
+
+
+def _deliver(job, recipients: list[str], **send_options):
+    """Send to the recipients the job has not reached yet, recording progress on the job."""
+    if not recipients:
+        raise ValueError("No recipients — set MAIL_RECIPIENT or add subscribers")
+    pending = [r for r in recipients if r not in job.delivered_to]
+    if pending:
+        # Renew the lease first (a tenant job may have queued for an SMTP session), then after every
+        # batch, so neither a crash nor a long send lets another run claim the job and mail them again
+        jobs.record_delivery(job, [])
+        try:
+            with metrics.timer("pipeline_stage_seconds", stage="deliver"):
+                delivered = _send_with_retry(job.fact, pending,
+                                             on_progress=lambda ok: jobs.record_delivery(job, ok), **send_options)
+        except email_sender.DeliveryError as e:
+            jobs.record_delivery(job, e.delivered)   # a resumed run only mails the rest
+            raise
+    else:
+        delivered = []
+    jobs.record_delivery(job, delivered, done=True)
+
+
+def _send_with_retry(fact, recipients: list[str] | None = None, **send_options) -> list[str]:
+    try:
+        return email_sender.send(fact, recipients, **send_options)
+    except email_sender.DeliveryError as e:
+        # Only the recipients that failed temporarily get the message again; 5xx (bad login, rejected) won't improve
+        retry = e.retryable
+        if not retry:
+            raise
+        logger.warning("[Pipeline] Email failed: %s — retrying %d recipient(s) in 10s...", e, len(retry))
         time.sleep(10)
-        email_sender.send(fact)   # Let this exception propagate if it fails again
+        try:
+            return e.delivered + email_sender.send(fact, retry, **send_options)
+        except email_sender.DeliveryError as again:
+            raise _combined(e, again) from None
+
+
+def _combined(first, again):
+    """One DeliveryError for both attempts: permanent failures from the first plus whatever still failed."""
+    failed = {r: err for r, err in first.failed.items() if r not in first.retryable}
+    failed.update(again.failed)
+    return email_sender.DeliveryError(failed, first.delivered + again.delivered)
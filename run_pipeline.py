@@ -1,17 +1,39 @@
 """
 Standalone pipeline runner for GitHub Actions (no web server needed).
-Usage: python run_pipeline.py
+Usage: python run_pipeline.py [--tenants]
+
+  --tenants  fan out to every active tenant instead of the default audience
+
+Startup is tuned for a cold process: the Groq SDK is imported and its client
+built on a background thread while the database connects and checks the
+schema version, and the dedup indexes keep loading while the first LLM
+request is in flight. Phase timings are logged and, on GitHub Actions,
+written to the job summary.
 """
+import time
+
+_started = time.perf_counter()
+
 import os
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 # Load .env only if it exists (local dev); in GitHub Actions, env vars come from secrets
 from dotenv import load_dotenv
 load_dotenv()
 
+import avoid_list
 import database
+import dedup_cache
+import email_sender
+import llm_client
+import near_dup
 import pipeline
+import tenants
+import topic_scheduler
+
+_imported = time.perf_counter()
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,13 +42,85 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Report order; phases run on the startup pool overlap the ones after them
+_PHASES = ("imports", "llm client", "init_db", "dedup cache", "near-dup index", "avoid-list index",
+           "topic coverage", "ready", "pipeline", "total")
+_BACKGROUND = ("llm client", "dedup cache", "near-dup index")
+
+
+def _timed(fn, timings: dict, name: str):
+    """fn wrapped to record its duration under timings[name] (also from a worker thread)."""
+    def wrapper():
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            timings[name] = time.perf_counter() - started
+    return wrapper
+
+
+def _report(timings: dict, notes: dict):
+    """Log the startup phases and add them to the GitHub Actions job summary, if there is one."""
+    phases = [(name, timings[name], notes.get(name, "")) for name in _PHASES if name in timings]
+    logger.info("[Startup] %s", ", ".join(
+        f"{name} {seconds:.3f}s" + (f" ({note})" if note else "") for name, seconds, note in phases
+    ))
+    summary = os.getenv("GITHUB_STEP_SUMMARY")
+    if not summary:
+        return
+    rows = "\n".join(f"| {name} | {seconds:.3f} | {note} |" for name, seconds, note in phases)
+    with open(summary, "a", encoding="utf-8") as f:
+        f.write(f"### Cold start\n\n| Phase | Seconds | Note |\n|---|---:|---|\n{rows}\n")
+
 
 def main():
-    logger.info("Initializing database...")
-    database.init_db()
+    timings = {"imports": _imported - _started}
+    notes = {name: "background" for name in _BACKGROUND}
+    success = False
+
+    try:
+        with ThreadPoolExecutor(max_workers=5, thread_name_prefix="startup") as startup:
+            llm_ready = startup.submit(_timed(llm_client.warm_up, timings, "llm client"))
+
+            logger.info("Initializing database...")
+            applied = _timed(database.init_db, timings, "init_db")()
+            notes["init_db"] = "schema applied" if applied else "schema current"
+
+            # Only the prompt needs these two before the first LLM call; dedup can wait
+            pipeline.defer_dedup_until([
+                startup.submit(_timed(dedup_cache.load, timings, "dedup cache")),
+                startup.submit(_timed(near_dup.load, timings, "near-dup index")),
+            ])
+            prompt_indexes = [
+                startup.submit(_timed(avoid_list.load, timings, "avoid-list index")),
+                startup.submit(_timed(topic_scheduler.load, timings, "topic coverage")),
+            ]
+            for future in prompt_indexes:
+                future.result()
+            llm_ready.result()
+            timings["ready"] = time.perf_counter() - _started
+
+            logger.info("Running pipeline...")
+            run_started = time.perf_counter()
+            if "--tenants" in sys.argv[1:]:
+                results = pipeline.run_tenants(tenants.load())
+                success = bool(results) and all(results.values())
+            else:
+                success = pipeline.run()
+            timings["pipeline"] = time.perf_counter() - run_started
 
-    logger.info("Running pipeline...")
-    success = pipeline.run()
+        if "--tenants" not in sys.argv[1:]:
+            # Delivery is done; pre-generate the next facts off the critical path
+            try:
+                pipeline.refill_buffer()
+            except Exception as e:
+                logger.warning("Buffer refill failed: %s", e)
+    finally:
+        llm_client.close()
+        email_sender.close()
+        database.close_pool()
+        timings["total"] = time.perf_counter() - _started
+        _report(timings, notes)
 
     if success:
         logger.info("Pipeline completed successfully.")
@@ -0,0 +1,36 @@
+"""
+Tenants: additional audiences with their own subscribers, topic set, schedule
+and dedup history (sent_facts.tenant_id). The original MAIL_RECIPIENT audience
+is the implicit default tenant (tenant_id NULL) and is not stored here.
+"""
+from dataclasses import dataclass, field
+
+import database
+from llm_client import TOPIC_AREAS
+
+
+@dataclass
+class Tenant:
+    id: int
+    name: str
+    topics: list[str]
+    schedule: str
+    subject_prefix: str
+    recipients: list[str] = field(default_factory=list)
+
+    def topic_set(self) -> set[str]:
+        """The tenant's topic hints; an empty list means every TOPIC_AREAS entry."""
+        return set(self.topics) if self.topics else set(TOPIC_AREAS)
+
+
+def load(schedule: str | None = None) -> list[Tenant]:
+    """Active tenants (optionally only those on one crontab schedule) with their subscribers."""
+    return [
+        Tenant(id=row[0], name=row[1], topics=list(row[2]), schedule=row[3], subject_prefix=row[4],
+               recipients=list(row[5]))
+        for row in database.get_tenants(schedule)
+    ]
+
+
+def schedules() -> list[str]:
+    return database.get_tenant_schedules()
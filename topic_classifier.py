@@ -0,0 +1,167 @@
+"""
+Keyword-based topic classifier.
+
+All category keywords are compiled into one Aho-Corasick automaton, so a
+text is scored against every category in a single pass regardless of how
+many keywords there are. Matches must sit on word boundaries ("GC" does not
+match inside "GCC") and are case-insensitive.
+
+Keywords come from CATEGORY_KEYWORDS, are derived from llm_client.TOPIC_AREAS,
+and can be extended with a JSON file ({"Category": ["kw", ...]}) named by
+TOPIC_KEYWORDS_FILE.
+"""
+import os
+import re
+import json
+import logging
+import threading
+from collections import deque
+
+from llm_client import TOPIC_AREAS
+
+logger = logging.getLogger(__name__)
+
+# Curated categories; these win ties against the ones derived from TOPIC_AREAS
+CATEGORY_KEYWORDS = {
+    "GC": ["GC", "Garbage Collector", "Garbage Collection", "G1", "ZGC", "Shenandoah"],
+    "JVM": ["JVM", "bytecode", "class loading", "classloader"],
+    "JIT": ["JIT", "C2 compiler", "inlining"],
+    "Memory Model": ["Memory Model", "happens-before", "memory barrier"],
+    "Concurrency": ["Concurrency", "virtual thread", "virtual threads", "CompletableFuture", "structured concurrency"],
+    "Thread": ["Thread", "threads", "ThreadLocal"],
+    "Executor": ["Executor", "ExecutorService", "ForkJoinPool", "thread pool"],
+    "Lock": ["Lock", "ReentrantLock", "synchronized", "deadlock"],
+    "Volatile": ["Volatile"],
+    "Auto-configuration": ["Auto-configuration", "@EnableAutoConfiguration", "@ConditionalOnClass"],
+    "AOP": ["AOP", "aspect", "@Aspect", "pointcut"],
+    "Bean": ["Bean", "@Bean", "bean lifecycle", "@Scope"],
+    "Transaction": ["Transaction", "@Transactional", "propagation"],
+    "WebFlux": ["WebFlux", "Mono", "Flux"],
+    "Reactive": ["Reactive", "backpressure", "Project Reactor"],
+    "Observability": ["Observability", "Micrometer", "tracing"],
+    "Actuator": ["Actuator"],
+    "Performance": ["Performance", "JMH", "JFR", "profiling"],
+}
+
+_WORD = re.compile(r"\w")
+_PAREN = re.compile(r"\(([^)]*)\)")
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton mapping lower-cased keywords to the categories that own them."""
+
+    def __init__(self, keywords: dict[str, set[str]]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[tuple[int, tuple[str, ...]]]] = [[]]
+
+        for keyword, categories in keywords.items():
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(keyword), tuple(sorted(categories))))
+
+        # Breadth-first pass to fill failure links and merge outputs along them
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for ch, nxt in self._goto[state].items():
+                pending.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+        self.size = len(keywords)
+
+    def matches(self, text: str):
+        """Yield (start, categories) for every word-bounded keyword occurrence in text."""
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, categories in out[state]:
+                start = i - length + 1
+                if _bounded(text, start, i + 1):
+                    yield start, categories
+
+
+def _bounded(text: str, start: int, end: int) -> bool:
+    # Only enforce a boundary on sides where the keyword itself begins/ends with a word character
+    if start > 0 and _WORD.match(text[start]) and _WORD.match(text[start - 1]):
+        return False
+    if end < len(text) and _WORD.match(text[end - 1]) and _WORD.match(text[end]):
+        return False
+    return True
+
+
+def _derived_keywords() -> dict[str, list[str]]:
+    """'Garbage Collection (G1, ZGC, tuning flags)' → {'Garbage Collection': ['Garbage Collection', 'G1', ...]}"""
+    derived = {}
+    for area in TOPIC_AREAS:
+        label = _PAREN.sub("", area).strip()
+        terms = [t for part in _PAREN.findall(area) for t in part.split(",")]
+        terms += label.split(",") if "," in label else [label]
+        derived[label] = [t.strip() for t in terms if t.strip()]
+    return derived
+
+
+def _load_config_file() -> dict[str, list[str]]:
+    path = os.getenv("TOPIC_KEYWORDS_FILE")
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_matcher: KeywordMatcher | None = None
+_priority: dict[str, int] = {}
+_matcher_lock = threading.Lock()
+
+
+def _get_matcher() -> KeywordMatcher:
+    """Build the automaton once, on first use (so TOPIC_KEYWORDS_FILE from .env is honoured)."""
+    global _matcher, _priority
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                sources = [CATEGORY_KEYWORDS, _load_config_file(), _derived_keywords()]
+                keywords: dict[str, set[str]] = {}
+                priority: dict[str, int] = {}
+                for source in sources:
+                    for category, terms in source.items():
+                        priority.setdefault(category, len(priority))
+                        for term in terms:
+                            keywords.setdefault(term.lower(), set()).add(category)
+                _priority = priority
+                _matcher = KeywordMatcher(keywords)
+                logger.info("[Classifier] %d keywords across %d categories", _matcher.size, len(priority))
+    return _matcher
+
+
+def classify(text: str) -> list[tuple[str, int]]:
+    """Return (category, hits) for every matching category, best first."""
+    matcher = _get_matcher()
+    scores: dict[str, int] = {}
+    first_seen: dict[str, int] = {}
+    for start, categories in matcher.matches(text):
+        for category in categories:
+            scores[category] = scores.get(category, 0) + 1
+            first_seen.setdefault(category, start)
+    return sorted(scores.items(), key=lambda kv: (-kv[1], _priority[kv[0]], first_seen[kv[0]]))
+
+
+def detect_category(text: str) -> str:
+    ranked = classify(text)
+    return ranked[0][0] if ranked else "General"
@@ -0,0 +1,195 @@
+"""
+Coverage-aware topic scheduler: picks the topic hint for each LLM call.
+
+A uniform random pick over TOPIC_AREAS keeps landing on topics that are
+already saturated, and every duplicate it produces costs another LLM call.
+Instead each topic gets a weight per audience
+
+    weight = (1 - dup_rate) * (mean_count + 1) / (count + 1) * recency
+
+  count     facts sent (or buffered) on the topic, TOPIC_AREAS entries and
+            a tenant's own topics alike; older facts without a topic_hint
+            are credited to the topics their topic_category classifies into
+  recency   damps the TOPIC_RECENCY_WINDOW most recently used topics
+  dup_rate  EWMA (TOPIC_DUP_ALPHA) of the share of candidates on the topic
+            that dedup rejected, updated in memory and written to topic_stats
+            by flush() at the end of a run, so one-shot runs learn too
+
+and n distinct topics are drawn by weighted sampling without replacement
+(Efraimidis–Spirakis keys), so under-covered topics that still yield new
+facts come first while every topic keeps some chance.
+
+Config (env): TOPIC_DUP_ALPHA, TOPIC_RECENCY_WINDOW.
+"""
+import os
+import heapq
+import random
+import logging
+import threading
+
+import database
+import topic_classifier
+from llm_client import TOPIC_AREAS
+
+logger = logging.getLogger(__name__)
+
+_MIN_SUCCESS = 0.05   # a topic that keeps producing duplicates still gets the odd retry
+
+
+class _Audience:
+    """Coverage, recency and learned duplicate rate per topic for one audience."""
+
+    def __init__(self):
+        self.counts: dict[str, float] = {}
+        self.last_used: dict[str, float] = {}   # ordering key only: epoch seconds from the DB, then a counter
+        self.dup_rates: dict[str, float] = {}
+        self.own_topics: set[str] = set()   # a tenant's custom topics beyond TOPIC_AREAS
+
+    def use(self, topic: str, amount: float, at: float):
+        self.counts[topic] = self.counts.get(topic, 0.0) + amount
+        if at > self.last_used.get(topic, float("-inf")):
+            self.last_used[topic] = at
+
+    def weights(self, topics: list[str], window: int) -> list[float]:
+        mean = sum(self.counts.get(t, 0.0) for t in topics) / len(topics)
+        newest = sorted(self.last_used.values(), reverse=True)
+        weights = []
+        for topic in topics:
+            coverage = (mean + 1) / (self.counts.get(topic, 0.0) + 1)
+            last = self.last_used.get(topic)
+            # Distinct topics used since this one; the newest topic is damped the most
+            since = len(newest) if last is None else sum(1 for t in newest if t > last)
+            recency = min(1.0, (since + 1) / (window + 1))
+            success = max(_MIN_SUCCESS, 1 - self.dup_rates.get(topic, 0.0))
+            weights.append(success * coverage * recency)
+        return weights
+
+
+_lock = threading.Lock()
+_audiences: dict[int, _Audience] | None = None   # keyed by tenant (0 = default audience)
+_clock = 0.0
+# Outcomes not yet in topic_stats, per (tenant key, topic): [samples, decay, increment]
+_unflushed: dict[tuple[int, str], list] = {}
+_topics_by_category: dict[str, list[str]] = {}
+
+
+def _category_topics() -> dict[str, list[str]]:
+    """Which TOPIC_AREAS entries each topic_category belongs to, for facts stored without a topic_hint."""
+    by_category: dict[str, list[str]] = {}
+    for topic in TOPIC_AREAS:
+        for category, _ in topic_classifier.classify(topic):
+            by_category.setdefault(category, []).append(topic)
+    return by_category
+
+
+def _credit(audience: _Audience, topic_hint: str | None, category: str | None, count: float, at: float):
+    if topic_hint in TOPIC_AREAS or topic_hint in audience.own_topics:
+        audience.use(topic_hint, count, at)
+        return
+    topics = _topics_by_category.get(category or "", [])
+    for topic in topics:
+        audience.use(topic, count / len(topics), at)
+
+
+def load():
+    global _audiences, _clock, _topics_by_category
+    _topics_by_category = _category_topics()
+    audiences: dict[int, _Audience] = {}
+    for tenant_id, _, topics, *_ in database.get_tenants():
+        audiences.setdefault(tenant_id, _Audience()).own_topics.update(topics)
+    latest = 0.0
+    for tenant_key, topic_hint, category, count, last_sent in database.topic_coverage():
+        last_sent = last_sent or 0.0
+        _credit(audiences.setdefault(tenant_key, _Audience()), topic_hint, category, count, last_sent)
+        latest = max(latest, last_sent)
+    for tenant_key, topic, dup_rate in database.get_topic_dup_rates():
+        audiences.setdefault(tenant_key, _Audience()).dup_rates[topic] = dup_rate
+    with _lock:
+        _audiences = audiences
+        _clock = latest
+    logger.info("[Topics] Coverage loaded for %d audience(s)", len(audiences))
+
+
+def add(topic_hint: str | None, category: str | None, tenant_id: int | None = None):
+    """Count a newly sent or buffered fact towards its topic's coverage."""
+    global _clock
+    with _lock:
+        if _audiences is None:
+            return
+        _clock += 1
+        _credit(_audiences.setdefault(tenant_id or 0, _Audience()), topic_hint, category, 1, _clock)
+
+
+def observe(topic: str | None, duplicate: bool, tenant_id: int | None = None):
+    """Feed one dedup verdict for a candidate requested on `topic` into its duplicate rate (stored by flush())."""
+    if topic is None or _audiences is None:
+        return
+    alpha = float(os.getenv("TOPIC_DUP_ALPHA", "0.2"))
+    dup = 1.0 if duplicate else 0.0
+    key = tenant_id or 0
+    with _lock:
+        rates = _audiences.setdefault(key, _Audience()).dup_rates
+        rates[topic] = rates.get(topic, 0.0) * (1 - alpha) + alpha * dup
+        pending = _unflushed.setdefault((key, topic), [0, 1.0, 0.0])
+        pending[0] += 1
+        pending[1] *= 1 - alpha
+        pending[2] = pending[2] * (1 - alpha) + alpha * dup
+
+
+def flush():
+    """Write the duplicate-rate updates observed since the last flush to topic_stats in one batch."""
+    global _unflushed
+    with _lock:
+        outcomes, _unflushed = _unflushed, {}
+    if not outcomes:
+        return
+    try:
+        database.record_topic_outcomes([(key or None, topic, samples, decay, increment)
+                                        for (key, topic), (samples, decay, increment) in outcomes.items()])
+    except Exception as e:
+        logger.warning("[Topics] Could not store the duplicate rates of %d topic(s): %s", len(outcomes), e)
+
+
+def _combined_weights(topics: list[str], tenant_ids) -> list[float]:
+    window = int(os.getenv("TOPIC_RECENCY_WINDOW", "5"))
+    keys = sorted({t or 0 for t in tenant_ids}) if tenant_ids else [0]
+    per_audience = [_audiences.get(k, _Audience()).weights(topics, window) for k in keys]
+    return [sum(ws) / len(ws) for ws in zip(*per_audience)]
+
+
+def pick(n: int, exclude: set[str] | frozenset = frozenset(), tenant_ids: list[int] | None = None,
+         candidates: list[str] | None = None) -> list[str]:
+    """
+    Up to n distinct topic hints from `candidates` (default TOPIC_AREAS),
+    preferring ones not in `exclude`, weighted for the given tenants' audiences
+    (the default audience when None). Uniformly random until load() has run.
+    """
+    pool = list(candidates or TOPIC_AREAS)
+    fresh = [t for t in pool if t not in exclude] or pool
+    n = min(n, len(fresh))
+    with _lock:
+        if _audiences is None:
+            return random.sample(fresh, n)
+        weights = _combined_weights(fresh, tenant_ids)
+    # Weighted sampling without replacement: the n largest of u ** (1 / w)
+    keyed = ((random.random() ** (1 / w), t) for t, w in zip(fresh, weights))
+    return [t for _, t in heapq.nlargest(n, keyed)]
+
+
+def stats() -> dict:
+    """Default-audience view: how saturated the topics look and the LLM calls a delivered fact is expected to cost."""
+    with _lock:
+        if _audiences is None:
+            return {"loaded": False}
+        audience = _audiences.get(0, _Audience())
+        weights = _combined_weights(TOPIC_AREAS, None)
+        rates = [audience.dup_rates.get(t, 0.0) for t in TOPIC_AREAS]
+    total = sum(weights)
+    expected = sum(w / total / max(_MIN_SUCCESS, 1 - r) for w, r in zip(weights, rates))
+    return {
+        "loaded": True,
+        "topics": len(TOPIC_AREAS),
+        "coveredTopics": sum(1 for t in TOPIC_AREAS if audience.counts.get(t)),
+        "meanDupRate": round(sum(rates) / len(rates), 4),
+        "expectedCallsPerFact": round(expected, 3),
+    }